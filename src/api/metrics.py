@@ -0,0 +1,118 @@
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+
+from core.metrics import registry
+from db.database import pool_stats, replica_set
+from services.cache import redirect_cache
+from services.clicks import click_ingestor
+from services.shared_cache import shared_cache
+from services.singleflight import single_flight
+from services.url_filter import url_filter
+
+
+metrics_router = APIRouter()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+def engine_pools():
+    # Pool stats of the primary and of each replica engine, by engine label.
+    pools = {'primary': pool_stats()}
+    if replica_set is not None:
+        for index, replica_engine in enumerate(replica_set.engines):
+            pools[f'replica{index}'] = pool_stats(replica_engine)
+    return pools
+
+
+def pool_metric(key):
+    return lambda: {(engine,): stats.get(key, 0)
+                    for engine, stats in engine_pools().items()}
+
+
+def pool_connections():
+    return {(engine, state): stats.get(state, 0)
+            for engine, stats in engine_pools().items()
+            for state in ('checked_in', 'checked_out', 'overflow')}
+
+
+registry.gauge('db_pool_connections', 'Pooled database connections by state.',
+               ('engine', 'state'), callback=pool_connections)
+registry.gauge('db_pool_saturation',
+               'Checked out connections over pool capacity.', ('engine',),
+               callback=pool_metric('saturation'))
+registry.counter('db_pool_checkouts_total', 'Connection checkouts.',
+                 ('engine',), callback=pool_metric('checkouts'))
+registry.counter('db_pool_timeouts_total',
+                 'Connection checkouts that timed out.', ('engine',),
+                 callback=pool_metric('timeouts'))
+registry.counter('db_pool_checkout_wait_seconds_total',
+                 'Time spent waiting for a connection.', ('engine',),
+                 callback=pool_metric('wait_time_total'))
+registry.gauge('db_pool_checkout_wait_seconds_max',
+               'Longest connection checkout wait.', ('engine',),
+               callback=pool_metric('wait_time_max'))
+
+
+def cache_requests():
+    requests = {('redirect', 'hit'): redirect_cache.hits,
+                ('redirect', 'miss'): redirect_cache.misses}
+    if shared_cache is not None:
+        requests.update({('shared', 'hit'): shared_cache.hits,
+                         ('shared', 'miss'): shared_cache.misses,
+                         ('shared', 'error'): shared_cache.errors})
+    return requests
+
+
+def cache_hit_ratio():
+    ratios = {('redirect',): redirect_cache.stats()['hit_ratio']}
+    if shared_cache is not None:
+        ratios[('shared',)] = shared_cache.stats()['hit_ratio']
+    return ratios
+
+
+registry.counter('cache_requests_total', 'Cache lookups by result.',
+                 ('cache', 'result'), callback=cache_requests)
+registry.gauge('cache_hit_ratio', 'Cache hit ratio since start.', ('cache',),
+               callback=cache_hit_ratio)
+registry.gauge('cache_entries', 'Entries held by the cache.', ('cache',),
+               callback=lambda: {('redirect',): len(redirect_cache)})
+
+registry.counter('single_flight_calls_total',
+                 'Coalescable reads by whether they ran or joined one in '
+                 'flight.', ('result',),
+                 callback=lambda: {('run',): single_flight.calls,
+                                   ('joined',): single_flight.coalesced})
+registry.gauge('single_flight_in_flight',
+               'Reads in flight that others can join.',
+               callback=lambda: {(): len(single_flight)})
+
+if url_filter is not None:
+    registry.counter('url_filter_rejected_total',
+                     'Redirects answered 404 by the url filter alone.',
+                     callback=lambda: {(): url_filter.rejected})
+    registry.counter('url_filter_refreshes_total', 'Url filter refreshes.',
+                     callback=lambda: {(): url_filter.refreshes})
+    registry.counter('url_filter_rebuilds_total', 'Url filter rebuilds.',
+                     callback=lambda: {(): url_filter.rebuilds})
+    registry.gauge('url_filter_keys', 'Keys added to the url filter.',
+                   callback=lambda: {(): url_filter.stats()['keys']})
+    registry.gauge('url_filter_false_positive_rate',
+                   'Expected false positive rate of the url filter.',
+                   callback=lambda: {(): url_filter.stats()['error_rate']})
+
+CLICK_OUTCOMES = ('enqueued', 'overflowed', 'dropped', 'flushed', 'failed')
+
+registry.counter('click_events_total', 'Click events by ingest outcome.',
+                 ('outcome',),
+                 callback=lambda: {(outcome,): click_ingestor.stats()[outcome]
+                                   for outcome in CLICK_OUTCOMES})
+registry.counter('click_batches_total', 'Click batches written.',
+                 callback=lambda: {(): click_ingestor.stats()['batches']})
+registry.gauge('click_queue_depth', 'Click events waiting to be flushed.',
+               callback=lambda: {(): click_ingestor.stats()['queued']})
+
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse,
+                    include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
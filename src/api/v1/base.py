@@ -5,14 +5,13 @@ from sqlalchemy import exc
 from sqlalchemy.orm import Session
 from starlette import status
 
-from api.v1 import requests, statuses, urls
-from db.database import get_session
+from api.v1 import statuses, urls
+from db.database import get_session, pool_stats, replica_set, storage
 
 
 base_router = APIRouter()
 
 base_router.include_router(statuses.status_router, prefix='/statuses', tags=['statuses'])
-base_router.include_router(requests.requests_router, prefix='/requests', tags=['requests'])
 base_router.include_router(urls.urls_router, prefix='/urls', tags=['urls'])
 
 
@@ -23,10 +22,15 @@ async def root_handler():
 
 @base_router.get('/ping', status_code=status.HTTP_200_OK)
 async def ping_db(db: Session = Depends(get_session)):
-    sql = 'SELECT version();'
     try:
-        result = await db.execute(sql)
-        ver_db, = [x for x in result.scalars()]
+        ver_db = await storage.version(db)
         return {'api': 'v1', 'python': sys.version_info, 'db': ver_db}
     except exc.SQLAlchemyError:
         return {'api': 'v1', 'python': sys.version_info, 'db': 'not available'}
+
+
+@base_router.get('/pool', status_code=status.HTTP_200_OK)
+async def get_pool_stats():
+    if replica_set:
+        return {**pool_stats(), 'replicas': [pool_stats(replica_engine) for replica_engine in replica_set.engines]}
+    return pool_stats()
@@ -1,19 +1,98 @@
+import contextlib
+import functools
+import json
+
+from typing import Any, AsyncContextManager, Callable, Tuple
+from urllib.parse import parse_qsl, quote
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.requests import Request
-from starlette.responses import RedirectResponse, Response
+from starlette.routing import Match, Route
+from starlette.types import Receive, Scope, Send
 
-from db.database import get_session
+from core.settings import settings
+from db.database import get_read_session, get_session, storage
 from services.requests import request_service_db
 
 
-requests_router = APIRouter()
+REDIRECT_PATH = '/api/v1/requests/{url_id:str}'
+
+Headers = Tuple[Tuple[bytes, bytes], ...]
+
+
+def json_response(content: Any) -> Tuple[Headers, bytes]:
+    body = json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode()
+    return ((b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())), body
+
+
+# Same bodies as FastAPI's HTTPException and validation error responses.
+NOT_FOUND = json_response({'detail': 'Не найдено.'})
+INVALID_USER_ID = json_response({'detail': [{'loc': ['query', 'user_id'], 'msg': 'value is not a valid uuid',
+                                             'type': 'type_error.uuid'}]})
+
+
+@functools.lru_cache(maxsize=settings.REDIRECT_CACHE_SIZE)
+def redirect_headers(url: str) -> Headers:
+    # Quoted like starlette's RedirectResponse, built once per target.
+    location = quote(url, safe=":/%#?=@[]!$&'()*+,;")
+    return (b'location', location.encode('latin-1')), (b'content-length', b'0')
+
+
+class RedirectRoute(Route):
+    # Plain starlette routes don't record themselves in the scope, the metrics middleware labels requests by it.
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Starlette adds HEAD to GET routes, but a click can't be recorded with that method.
+        self.methods.discard('HEAD')
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        match, child_scope = super().matches(scope)
+        if match != Match.NONE:
+            child_scope['route'] = self
+        return match, child_scope
+
+
+class RedirectEndpoint:
+    # Redirects are nearly all of the traffic, so they skip FastAPI: no dependency injection, no request
+    # validation and no response class, just the raw ASGI messages. A database session is only opened
+    # by the service on a cache miss.
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        user_id = None
+        if scope['query_string']:
+            for name, value in parse_qsl(scope['query_string'].decode('latin-1')):
+                if name == 'user_id':
+                    try:
+                        user_id = UUID(value)
+                    except ValueError:
+                        await self.send(send, 422, *INVALID_USER_ID)
+                        return
+
+        host = ''
+        for name, value in scope['headers']:
+            if name == b'host':
+                host = value.decode('latin-1').split(':')[0]
+                break
+
+        key = request_service_db.parse_key(scope['path_params']['url_id'])
+        url = await request_service_db.redirect(key, user_id=user_id, method=scope['method'], host=host,
+                                                session=functools.partial(self.session, scope, get_session, storage.session),
+                                                read_session=functools.partial(self.session, scope, get_read_session,
+                                                                               storage.read_session))
+        if url is None:
+            await self.send(send, 404, *NOT_FOUND)
+        else:
+            await self.send(send, 307, redirect_headers(url), b'')
+
+    def session(self, scope: Scope, dependency: Callable, session_factory: Callable[[], AsyncContextManager]) -> AsyncContextManager:
+        # Honours app.dependency_overrides of the session dependencies like the FastAPI routes do.
+        if override := scope['app'].dependency_overrides.get(dependency):
+            return contextlib.asynccontextmanager(override)()
+        return session_factory()
+
+    async def send(self, send: Send, status: int, headers: Headers, body: bytes) -> None:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
 
 
-@requests_router.get('/{url_id:str}', response_class=Response)
-async def get_request(url_id: UUID, request: Request, user_id: UUID | None = None, db: AsyncSession = Depends(get_session)) -> RedirectResponse:
-    url = await request_service_db.request(url_id=url_id, user_id=user_id, db=db, method=request.method,
-                                        host=request.headers.get('host', '').split(':')[0])
-    return RedirectResponse(url=url)
+redirect_route = RedirectRoute(REDIRECT_PATH, RedirectEndpoint(), methods=['GET'], name='get_request')
@@ -0,0 +1,13 @@
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    media_type = 'application/x-ndjson'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # The body iterator may still be reading the request stream, so receive() must not be
+        # polled for a disconnect concurrently, as StreamingResponse does.
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -1,10 +1,16 @@
-from typing import Any
+from datetime import datetime
+from typing import Any, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
 
-from db.database import get_session
+from db.database import get_read_session
+from schemas import statuses
+from services.analytics import analytics_service_db
+from services.counters import counter_service_db
+from services.pagination import NEXT_CURSOR_HEADER, next_cursor
 from services.statuses import status_service_db
 
 
@@ -12,7 +18,56 @@ status_router = APIRouter()
 
 
 @status_router.get('/', response_model=None)
-async def get_status(url_id: UUID | None = None, user_id: UUID | None = None, host: str | None = None,
-                     method: str | None = None, skip: int = 0, limit: int = 100,
-                     db: AsyncSession = Depends(get_session)) -> Any:
-    return await status_service_db.get_request(url_id=url_id, user_id=user_id, host=host, method=method, db=db, skip=skip, limit=limit)
+async def get_status(response: Response, url_id: UUID | None = None,
+                     user_id: UUID | None = None, host: str | None = None,
+                     method: str | None = None,
+                     since: datetime | None = None,
+                     until: datetime | None = None, skip: int = 0,
+                     limit: int = Query(100, ge=1, le=1000),
+                     cursor: str | None = None,
+                     db: AsyncSession = Depends(get_read_session)) -> Any:
+    items = await status_service_db.get_request(
+        url_id=url_id, user_id=user_id, host=host, request_methods=method,
+        db=db, since=since, until=until, skip=skip, limit=limit,
+        cursor=cursor)
+    if token := next_cursor(items, limit):
+        response.headers[NEXT_CURSOR_HEADER] = token
+    return items
+
+
+@status_router.get('/export', response_class=StreamingResponse)
+async def export_statuses(url_id: UUID | None = None,
+                          since: datetime | None = None,
+                          until: datetime | None = None,
+                          format: Literal['ndjson', 'csv'] = 'ndjson',
+                          db: AsyncSession = Depends(get_read_session)
+                          ) -> StreamingResponse:
+    content = status_service_db.export(db, url_id=url_id, since=since,
+                                       until=until, format=format)
+    if format == 'csv':
+        return StreamingResponse(content, media_type='text/csv', headers={
+            'Content-Disposition': 'attachment; filename="statuses.csv"'})
+    return StreamingResponse(content, media_type='application/x-ndjson')
+
+
+@status_router.get('/summary', response_model=statuses.ClickSummarySchema)
+async def get_summary(url_id: UUID,
+                      granularity: Literal['hour', 'day'] | None = None,
+                      since: datetime | None = None,
+                      until: datetime | None = None,
+                      db: AsyncSession = Depends(get_read_session)) -> Any:
+    return await counter_service_db.get_summary(db, url_id, granularity,
+                                                since=since, until=until)
+
+
+@status_router.get('/analytics',
+                   response_model=statuses.ClickAnalyticsSchema)
+async def get_analytics(url_id: UUID,
+                        granularity: Literal['minute', 'hour', 'day'] = 'hour',
+                        since: datetime | None = None,
+                        until: datetime | None = None,
+                        top: int = Query(10, ge=1, le=100),
+                        db: AsyncSession = Depends(get_read_session)) -> Any:
+    return await analytics_service_db.get_analytics(
+        db, url_id, granularity=granularity, since=since, until=until,
+        top=top)
@@ -1,11 +1,15 @@
 from typing import Any, List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.database import get_session
+from api.v1.responses import NDJSONStreamingResponse
+
+from db.database import get_read_session, get_session
 from schemas import urls
+from services.imports import url_import_service
+from services.pagination import NEXT_CURSOR_HEADER, next_cursor
 from services.urls import url_service_db
 
 
@@ -14,30 +18,39 @@ urls_router = APIRouter()
 
 @urls_router.post('/url', response_model=urls.UrlReadSchema, status_code=status.HTTP_201_CREATED)
 async def create_url(*, url: urls.UrlCreateSchema, db: AsyncSession = Depends(get_session)) -> Any:
-    return await url_service_db.create_object(db=db, obj_in=url)
+    return await url_service_db.create_object(db=db, obj=url)
 
 
 @urls_router.post('/urls', response_model=List[urls.UrlReadSchema], status_code=status.HTTP_201_CREATED)
 async def create_urls(*, urls: List[urls.UrlCreateSchema], db: AsyncSession = Depends(get_session)) -> Any:
-    urls = await url_service_db.create_objects(db=db, obj_in=urls)
+    urls = await url_service_db.create_objects(db=db, obj=urls)
     return urls
 
 
+@urls_router.post('/import', response_class=NDJSONStreamingResponse, status_code=status.HTTP_200_OK)
+async def import_urls(*, request: Request, db: AsyncSession = Depends(get_session)) -> NDJSONStreamingResponse:
+    return NDJSONStreamingResponse(url_import_service.import_ndjson(db, request.stream()))
+
+
 @urls_router.get('/urls/{id}', response_model=urls.UrlReadSchema, status_code=status.HTTP_200_OK)
-async def read_url(*, db: AsyncSession = Depends(get_session), id: UUID) -> Any:
+async def read_url(*, db: AsyncSession = Depends(get_read_session), id: UUID) -> Any:
     if url := await url_service_db.get_object(db=db, id=id):
         return url
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
 
 
 @urls_router.get('/urls', response_model=List[urls.UrlReadSchema], status_code=status.HTTP_200_OK)
-async def read_urls(*, db: AsyncSession = Depends(get_session), skip: int = 0, limit: int = 100) -> Any:
-    return await url_service_db.get_objects(db=db, skip=skip, limit=limit)
+async def read_urls(*, db: AsyncSession = Depends(get_read_session), response: Response, skip: int = 0,
+                    limit: int = Query(100, ge=1, le=1000), cursor: str | None = None) -> Any:
+    items = await url_service_db.get_objects(db=db, skip=skip, limit=limit, cursor=cursor)
+    if token := next_cursor(items, limit):
+        response.headers[NEXT_CURSOR_HEADER] = token
+    return items
 
 
 @urls_router.put('/urls/{id}', response_model=urls.UrlReadSchema, status_code=status.HTTP_200_OK)
 async def update_url(*, db: AsyncSession = Depends(get_session), id: UUID, url: urls.UrlUpdateSchema) -> Any:
-    if url := await url_service_db.update_object(db=db, id=id, obj_in=url):
+    if url := await url_service_db.update_object(db=db, id=id, obj=url):
         return url
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
 
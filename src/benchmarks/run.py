@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+
+SCENARIOS = ('create_batch', 'create_single', 'redirect', 'status', 'summary')
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+@dataclass
+class Result:
+    requests: int = 0
+    errors: int = 0
+    duration: float = 0.0
+    throughput: float = 0.0
+    mean: float = 0.0
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    def summarize(self) -> dict:
+        latencies = sorted(self.latencies)
+        if latencies:
+            self.mean = sum(latencies) / len(latencies)
+            self.p50, self.p95, self.p99 = (percentile(latencies, rank) for rank in (50, 95, 99))
+        self.throughput = self.requests / self.duration if self.duration else 0.0
+        summary = asdict(self)
+        del summary['latencies']
+        return summary
+
+
+def percentile(values: List[float], rank: float) -> float:
+    # Nearest-rank percentile over already sorted values.
+    index = max(0, min(len(values) - 1, math.ceil(rank / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def drive(client: httpx.AsyncClient, request: Request, total: int, concurrency: int) -> Result:
+    result = Result()
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for number in counter:
+            started = time.perf_counter()
+            try:
+                response = await request(client, number)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            result.latencies.append(time.perf_counter() - started)
+            result.requests += 1
+            result.errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.duration = time.perf_counter() - started
+    return result
+
+
+class Benchmark:
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:12]
+        # Warmup and timed requests both create URLs, so every created one gets a fresh number.
+        self.numbers = itertools.count()
+        self.codes: List[str] = []
+        self.ids: List[str] = []
+
+    def url(self, number: int, kind: str) -> str:
+        return f'https://bench.invalid/{self.run_id}/{kind}/{number}'
+
+    async def seed(self, client: httpx.AsyncClient) -> None:
+        size = self.args.batch_size
+        for start in range(0, self.args.dataset, size):
+            body = [{'url': self.url(number, 'seed')} for number in range(start, min(start + size, self.args.dataset))]
+            response = await client.post('/api/v1/urls/urls', json=body)
+            response.raise_for_status()
+            for item in response.json():
+                self.ids.append(item['id'])
+                self.codes.append(item['short_code'] or item['id'])
+
+    def requests(self) -> Dict[str, Request]:
+        size = self.args.batch_size
+
+        async def create_batch(client: httpx.AsyncClient, number: int) -> httpx.Response:
+            body = [{'url': self.url(next(self.numbers), 'batch')} for _ in range(size)]
+            return await client.post('/api/v1/urls/urls', json=body)
+
+        async def create_single(client: httpx.AsyncClient, number: int) -> httpx.Response:
+            return await client.post('/api/v1/urls/url', json={'url': self.url(next(self.numbers), 'single')})
+
+        async def redirect(client: httpx.AsyncClient, number: int) -> httpx.Response:
+            # Skewed towards the first links, like real redirect traffic.
+            code = self.codes[min(int(random.paretovariate(1.16)) - 1, len(self.codes) - 1)]
+            return await client.get(f'/api/v1/requests/{code}')
+
+        async def status(client: httpx.AsyncClient, number: int) -> httpx.Response:
+            return await client.get('/api/v1/statuses/', params={'url_id': random.choice(self.ids), 'limit': 100})
+
+        async def summary(client: httpx.AsyncClient, number: int) -> httpx.Response:
+            return await client.get('/api/v1/statuses/summary', params={'url_id': random.choice(self.ids), 'granularity': 'hour'})
+
+        return {'create_batch': create_batch, 'create_single': create_single, 'redirect': redirect,
+                'status': status, 'summary': summary}
+
+    async def run(self, client: httpx.AsyncClient) -> Dict[str, dict]:
+        await self.seed(client)
+        requests = self.requests()
+        results = {}
+        for scenario in self.args.scenarios:
+            total = self.args.requests if scenario != 'create_batch' else max(1, self.args.requests // self.args.batch_size)
+            if self.args.warmup:
+                await drive(client, requests[scenario], min(self.args.warmup, total), self.args.concurrency)
+            result = await drive(client, requests[scenario], total, self.args.concurrency)
+            results[scenario] = result.summarize()
+            print(f'{scenario:>14}: {results[scenario]["throughput"]:9.1f} req/s  p50 {results[scenario]["p50"] * 1000:7.2f} ms  '
+                  f'p95 {results[scenario]["p95"] * 1000:7.2f} ms  p99 {results[scenario]["p99"] * 1000:7.2f} ms  '
+                  f'errors {results[scenario]["errors"]}')
+        return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for scenario, current in results.items():
+        if scenario not in baseline:
+            continue
+        previous = baseline[scenario]
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append(f'{scenario}: throughput {current["throughput"]:.1f} < {previous["throughput"]:.1f} req/s')
+        for key in ('p95', 'p99'):
+            if current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f'{scenario}: {key} {current[key] * 1000:.2f} > {previous[key] * 1000:.2f} ms')
+        if current['errors'] > previous['errors']:
+            regressions.append(f'{scenario}: errors {current["errors"]} > {previous["errors"]}')
+    return regressions
+
+
+async def open_client(args: argparse.Namespace):
+    if args.base_url:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        return httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30), None
+
+    # In-process: the app runs in this event loop over ASGI, with its startup/shutdown hooks.
+    # Rate limiting would throttle the single benchmark client, so it is off unless set explicitly.
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    if args.storage:
+        os.environ['STORAGE_BACKEND'] = args.storage
+    from main import app
+
+    await app.router.startup()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark', timeout=30), app
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.seed)
+    client, app = await open_client(args)
+    try:
+        async with client:
+            results = await Benchmark(args).run(client)
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'target': args.base_url or 'in-process',
+            'storage': args.storage,
+            'python': platform.python_version(),
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'dataset': args.dataset,
+            'batch_size': args.batch_size,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}.')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f'Baseline saved to {args.baseline}.')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        if regressions := compare(results, baseline, args.tolerance):
+            print('Performance regressions against the baseline:', *regressions, sep='\n  ')
+            return 1
+        print('No regressions against the baseline.')
+    return 0
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Load test the redirect, create and status endpoints.')
+    parser.add_argument('--base-url', help='Benchmark a running server instead of the app in-process.')
+    parser.add_argument('--storage', choices=('postgres', 'memory'),
+                        help='Storage backend of the in-process app, memory benchmarks the HTTP layer alone.')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=100, help='Untimed requests before each scenario.')
+    parser.add_argument('--dataset', type=int, default=1000, help='URLs created before the scenarios run.')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative slowdown before failing.')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,42 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    # A fixed number of bits and hashes: each key sets `hashes` bits picked by double hashing of one
+    # 128 bit digest. A key that was added is always reported, one that wasn't is reported with a
+    # probability that grows as the filter fills up. Keys can't be removed.
+
+    def __init__(self, size: int, error_rate: float) -> None:
+        if size <= 0:
+            raise ValueError('A Bloom filter needs at least one byte.')
+        if not 0 < error_rate < 1:
+            raise ValueError(f'Error rate {error_rate} is out of range.')
+        self.bits = size * 8
+        # The optimal number of hashes for the target rate, and how many keys the bits hold at that rate.
+        self.hashes = max(1, round(-math.log2(error_rate)))
+        self.capacity = int(self.bits * math.log(2) ** 2 / -math.log(error_rate))
+        self.count = 0
+        self._array = bytearray(size)
+
+    @property
+    def size(self) -> int:
+        return len(self._array)
+
+    @property
+    def error_rate(self) -> float:
+        # Expected false positive rate at the current number of keys.
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + index * second) % self.bits for index in range(self.hashes))
+
+    def add(self, key: bytes) -> None:
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
@@ -1,8 +1,54 @@
+import atexit
+import json
 import logging
+import queue
+
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+
+from core.settings import settings
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'location': f'{record.filename}:{record.lineno}',
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class LocalQueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record is not made picklable: only the
+        # message is merged here and exception formatting is left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
-def get_logger(logger_name: str, log_level: str = 'INFO') -> logging.Logger:
+_listener: QueueListener | None = None
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(logger_name: str, log_level: str = 'INFO', queued: bool = False, json_format: bool = False,
+               log_file: str = 'log_file.log') -> logging.Logger:
+    global _listener
+
     logger_config = {
         'version': 1,
         'disable_existing_loggers': False,
@@ -10,19 +56,22 @@ def get_logger(logger_name: str, log_level: str = 'INFO') -> logging.Logger:
             'default': {
                 'format': '[%(filename)s:%(lineno)s - %(funcName)20s()] %(asctime)s %(message)s'
             },
+            'json': {
+                '()': JsonFormatter,
+            },
         },
         'handlers': {
             'console': {
                 'level': log_level,
-                'formatter': 'default',
+                'formatter': 'json' if json_format else 'default',
                 'class': 'logging.StreamHandler',
                 'stream': 'ext://sys.stderr',
             },
             'file': {
                 'level': log_level,
                 'class': 'logging.handlers.RotatingFileHandler',
-                'formatter': 'default',
-                'filename': 'log_file.log',
+                'formatter': 'json' if json_format else 'default',
+                'filename': log_file,
                 'maxBytes': 500000,
                 'backupCount': 10
             }
@@ -36,11 +85,23 @@ def get_logger(logger_name: str, log_level: str = 'INFO') -> logging.Logger:
         }
     }
 
+    stop_listener()
     dictConfig(logger_config)
 
+    if queued:
+        # Records are only put on a queue in the calling thread; formatting, disk writes and
+        # rotation happen on the listener's background thread.
+        root = logging.getLogger()
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+        root.handlers = [LocalQueueHandler(log_queue)]
+        _listener.start()
+
     return logging.getLogger(logger_name)
 
 
-LOG_LEVEL = 'DEBUG'
+LOG_LEVEL = settings.LOG_LEVEL
+
+logger = get_logger('root', LOG_LEVEL, queued=settings.LOG_QUEUED, json_format=settings.LOG_JSON, log_file=settings.LOG_FILE)
 
-logger = get_logger('root', LOG_LEVEL)
+atexit.register(stop_listener)
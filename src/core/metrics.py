@@ -0,0 +1,133 @@
+import bisect
+import math
+
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+
+# Metrics are only touched from the event loop thread (SQLAlchemy events included, since the
+# async engine runs them on the loop's greenlet), so recording is a plain dict update, no locks.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}', *self.samples()]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Mapping[Labels, float]] | None = None) -> None:
+        # With a callback the values are read from it at render time, e.g. from stats() of a component.
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Labels, float] = {}
+        self.callback = callback
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        values = self.callback() if self.callback else self.values
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]; counts are made cumulative on render.
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+
+class Registry:
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered.')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (),
+                callback: Callable[[], Mapping[Labels, float]] | None = None) -> Counter:
+        return self.register(Counter(name, help, labelnames, callback))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              callback: Callable[[], Mapping[Labels, float]] | None = None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+http_latency = registry.histogram('http_request_duration_seconds', 'HTTP request latency by route.', ('method', 'route'))
+db_latency = registry.histogram('db_query_duration_seconds', 'Database statement latency by operation.', ('operation',))
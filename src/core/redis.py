@@ -0,0 +1,115 @@
+import asyncio
+
+from typing import Any, List, Tuple
+from urllib.parse import unquote, urlparse
+
+
+class RedisError(Exception):
+    pass
+
+
+class ReplyError(RedisError):
+    # An error reply from the server, the connection stays usable.
+    pass
+
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def encode_command(*args: Any) -> bytes:
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b'\r\n')
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b'+':
+        return rest.decode()
+    if prefix == b'-':
+        raise ReplyError(rest.decode())
+    if prefix == b':':
+        return int(rest)
+    if prefix == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b'*':
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisError(f'Unexpected reply {line!r}.')
+
+
+class RedisClient:
+    # Just enough of the Redis protocol (RESP2) for the shared cache: commands go over a small pool of
+    # connections, one command in flight per connection. A connection that fails mid command is dropped.
+
+    def __init__(self, url: str, *, pool_size: int = 10, timeout: float = 1.0) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f'Unsupported Redis url {url!r}.')
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+
+        self._idle: List[Connection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def connect(self) -> Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.password:
+                await self.command((reader, writer), 'AUTH', self.password)
+            if self.db:
+                await self.command((reader, writer), 'SELECT', self.db)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def command(self, connection: Connection, *args: Any) -> Any:
+        reader, writer = connection
+        writer.write(encode_command(*args))
+        await writer.drain()
+        return await read_reply(reader)
+
+    async def execute(self, *args: Any) -> Any:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self.connect(), self.timeout)
+                reply = await asyncio.wait_for(self.command(connection, *args), self.timeout)
+            except ReplyError:
+                if connection is not None:
+                    self._idle.append(connection)
+                raise
+            except BaseException as exc:
+                if connection is not None:
+                    connection[1].close()
+                # A connection closed mid reply, or a reply that doesn't parse.
+                if isinstance(exc, (EOFError, ValueError, asyncio.LimitOverrunError)):
+                    raise RedisError(f'Broken reply from Redis: {exc!r}.') from exc
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
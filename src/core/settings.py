@@ -16,6 +16,21 @@ class Settings(BaseSettings):
     DB_HOST: Final[str] = Field(..., env='DB_HOST')
     DB_URL: Optional[Union[PostgresDsn, str]] = ''
 
+    DB_ECHO: bool = Field(False, env='DB_ECHO')
+    DB_POOL_SIZE: int = Field(10, env='DB_POOL_SIZE')
+    DB_MAX_OVERFLOW: int = Field(20, env='DB_MAX_OVERFLOW')
+    DB_POOL_TIMEOUT: float = Field(30, env='DB_POOL_TIMEOUT')
+    DB_POOL_RECYCLE: int = Field(1800, env='DB_POOL_RECYCLE')
+    DB_POOL_PRE_PING: bool = Field(True, env='DB_POOL_PRE_PING')
+    DB_STATEMENT_CACHE_SIZE: int = Field(100, env='DB_STATEMENT_CACHE_SIZE')
+    DB_POOL_WARMUP: bool = Field(True, env='DB_POOL_WARMUP')
+    STORAGE_BACKEND: str = Field('postgres', env='STORAGE_BACKEND')
+    # Comma separated DSNs of read replicas, read-only queries are spread over them.
+    DB_REPLICA_URLS: str = Field('', env='DB_REPLICA_URLS')
+    DB_REPLICA_SELECTION: str = Field('round_robin', env='DB_REPLICA_SELECTION')
+    # Seconds after a change to a url during which it is read from the primary, longer than the replica lag.
+    DB_REPLICA_WRITE_WINDOW: float = Field(5, env='DB_REPLICA_WRITE_WINDOW')
+
     TEST_DB_USER: Final[str] = Field(..., env='TEST_DB_USER')
     TEST_DB_PASSWORD: Final[str] = Field(..., env='TEST_DB_PASSWORD')
     TEST_DB_NAME: Final[str] = Field(..., env='TEST_DB_NAME')
@@ -25,15 +40,72 @@ class Settings(BaseSettings):
 
     HOST: Final[str] = Field(..., env='HOST')
     PORT: Final[int] = Field(..., env='PORT')
+    WORKERS: int = Field(0, env='WORKERS')
+    SERVER_LOOP: str = Field('auto', env='SERVER_LOOP')
+    SERVER_HTTP: str = Field('auto', env='SERVER_HTTP')
+    SERVER_BACKLOG: int = Field(2048, env='SERVER_BACKLOG')
+    SERVER_KEEP_ALIVE: int = Field(5, env='SERVER_KEEP_ALIVE')
+    SERVER_ACCESS_LOG: bool = Field(False, env='SERVER_ACCESS_LOG')
 
     PROJECT_NAME: Final[str] = Field(..., env='PROJECT_NAME')
 
+    LOG_LEVEL: str = Field('DEBUG', env='LOG_LEVEL')
+    LOG_QUEUED: bool = Field(True, env='LOG_QUEUED')
+    LOG_JSON: bool = Field(False, env='LOG_JSON')
+    LOG_FILE: str = Field('log_file.log', env='LOG_FILE')
+
+    REDIRECT_CACHE_SIZE: int = Field(100_000, env='REDIRECT_CACHE_SIZE')
+    REDIRECT_CACHE_TTL: float = Field(300, env='REDIRECT_CACHE_TTL')
+    REDIRECT_CACHE_NEGATIVE_TTL: float = Field(30, env='REDIRECT_CACHE_NEGATIVE_TTL')
+    REDIRECT_CACHE_WARMUP: int = Field(1000, env='REDIRECT_CACHE_WARMUP')
+
+    # '' (off), 'memory' or 'redis'; shared by all workers in front of redirect and url lookups.
+    SHARED_CACHE_BACKEND: str = Field('', env='SHARED_CACHE_BACKEND')
+    SHARED_CACHE_URL: str = Field('redis://localhost:6379/0', env='SHARED_CACHE_URL')
+    SHARED_CACHE_POOL_SIZE: int = Field(10, env='SHARED_CACHE_POOL_SIZE')
+    SHARED_CACHE_TIMEOUT: float = Field(0.5, env='SHARED_CACHE_TIMEOUT')
+    SHARED_CACHE_PREFIX: str = Field('shortener:', env='SHARED_CACHE_PREFIX')
+    SHARED_CACHE_TTL: float = Field(3600, env='SHARED_CACHE_TTL')
+    SHARED_CACHE_NEGATIVE_TTL: float = Field(30, env='SHARED_CACHE_NEGATIVE_TTL')
+    SHARED_CACHE_LOCK_TTL: float = Field(5, env='SHARED_CACHE_LOCK_TTL')
+    SHARED_CACHE_LOCK_WAIT: float = Field(1, env='SHARED_CACHE_LOCK_WAIT')
+    SHARED_CACHE_INVALIDATE_TTL: float = Field(5, env='SHARED_CACHE_INVALIDATE_TTL')
+    # Cap on REDIRECT_CACHE_TTL and REDIRECT_CACHE_NEGATIVE_TTL while a shared cache is configured.
+    SHARED_CACHE_LOCAL_TTL: float = Field(5, env='SHARED_CACHE_LOCAL_TTL')
+
+    # Bloom filter of live url ids and short codes, in bytes (0 turns it off), and its target false
+    # positive rate, which sets how many urls it holds at that rate. Creates in other workers are seen
+    # on a refresh, which rescans the urls created in the last REFRESH_OVERLAP seconds.
+    URL_FILTER_SIZE: int = Field(8 * 1024 * 1024, env='URL_FILTER_SIZE')
+    URL_FILTER_ERROR_RATE: float = Field(0.01, env='URL_FILTER_ERROR_RATE')
+    URL_FILTER_REFRESH_INTERVAL: float = Field(1.0, env='URL_FILTER_REFRESH_INTERVAL')
+    URL_FILTER_REFRESH_OVERLAP: float = Field(60, env='URL_FILTER_REFRESH_OVERLAP')
+    URL_FILTER_REBUILD_INTERVAL: float = Field(900, env='URL_FILTER_REBUILD_INTERVAL')
+
+    CLICK_QUEUE_SIZE: int = Field(10_000, env='CLICK_QUEUE_SIZE')
+    CLICK_BATCH_SIZE: int = Field(500, env='CLICK_BATCH_SIZE')
+    CLICK_FLUSH_INTERVAL: float = Field(1.0, env='CLICK_FLUSH_INTERVAL')
+    CLICK_PUT_TIMEOUT: float = Field(0.01, env='CLICK_PUT_TIMEOUT')
+    CLICK_FLUSH_RETRIES: int = Field(3, env='CLICK_FLUSH_RETRIES')
+    CLICK_RETRY_BACKOFF: float = Field(0.1, env='CLICK_RETRY_BACKOFF')
+
+    BULK_INSERT_CHUNK_SIZE: int = Field(1000, env='BULK_INSERT_CHUNK_SIZE')
+    IMPORT_MAX_LINE_SIZE: int = Field(65_536, env='IMPORT_MAX_LINE_SIZE')
+    EXPORT_BATCH_SIZE: int = Field(5000, env='EXPORT_BATCH_SIZE')
+
+    ANALYTICS_DEFAULT_RANGE: float = Field(86_400, env='ANALYTICS_DEFAULT_RANGE')
+    ANALYTICS_MAX_BUCKETS: int = Field(10_000, env='ANALYTICS_MAX_BUCKETS')
+
+    STATUS_PARTITION_INTERVAL: str = Field('month', env='STATUS_PARTITION_INTERVAL')
+    STATUS_PARTITIONS_AHEAD: int = Field(2, env='STATUS_PARTITIONS_AHEAD')
+    STATUS_PARTITION_CHECK_INTERVAL: float = Field(3600, env='STATUS_PARTITION_CHECK_INTERVAL')
+    STATUS_RETENTION_DAYS: int = Field(0, env='STATUS_RETENTION_DAYS')
+    STATUS_RETENTION_ACTION: str = Field('drop', env='STATUS_RETENTION_ACTION')
 
     class Config:
         env_file = os.path.join(BASE_DIR, '../../.env')
         env_file_encoding = 'utf-8'
 
-
     @validator('DB_URL', pre=True)
     def connect_to_postgres_dsn(cls, value: Optional[str], values: Dict[str, Any]) -> Any:
         if isinstance(value, str) and value != '':
@@ -60,7 +132,23 @@ class Settings(BaseSettings):
             path=f'/{values.get("TEST_DB_NAME") or ""}',
         )
 
+    @property
+    def replica_urls(self) -> Tuple[str, ...]:
+        return tuple(url.strip() for url in self.DB_REPLICA_URLS.split(',') if url.strip())
+
     banned_hosts: Tuple[str, ...] = ('example.com', '*.example.com')
+    banned_networks: Tuple[str, ...] = ()
+    BANNED_HOSTS_FILE: Optional[str] = Field(None, env='BANNED_HOSTS_FILE')
+    BANNED_HOSTS_RELOAD_INTERVAL: float = Field(5.0, env='BANNED_HOSTS_RELOAD_INTERVAL')
+
+    RATE_LIMIT_ENABLED: bool = Field(True, env='RATE_LIMIT_ENABLED')
+    RATE_LIMIT_SWEEP_INTERVAL: float = Field(60.0, env='RATE_LIMIT_SWEEP_INTERVAL')
+    # Single and batch creation; imports are not limited, one import request is a whole inventory.
+    rate_limits: Tuple[Tuple[str, str, float, int], ...] = (
+        ('POST', '/api/v1/urls/url', 5.0, 20),
+        ('POST', '/api/v1/urls/urls', 5.0, 20),
+        ('GET', '/api/v1/requests/', 100.0, 200),
+    )
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,28 @@
+import string
+
+from shortuuid.main import int_to_string, string_to_int
+
+
+ALPHABET = list(string.digits + string.ascii_letters)
+CODE_LENGTH = 7
+CAPACITY = len(ALPHABET) ** CODE_LENGTH
+
+# Sequence values are mapped through an affine bijection modulo CAPACITY, so consecutive
+# links get unrelated-looking codes while every code still decodes to exactly one value.
+# The multiplier must stay coprime with 62 ** 7, i.e. odd and not divisible by 31.
+MULTIPLIER = 2_176_477_521_739
+OFFSET = 918_563_027_459
+INVERSE = pow(MULTIPLIER, -1, CAPACITY)
+
+
+def encode_short_id(short_id: int) -> str:
+    if not 0 < short_id < CAPACITY:
+        raise ValueError(f'Short id {short_id} is out of range.')
+    return int_to_string((short_id * MULTIPLIER + OFFSET) % CAPACITY, ALPHABET, padding=CODE_LENGTH)
+
+
+def decode_short_code(code: str) -> int | None:
+    if len(code) != CODE_LENGTH or any(char not in ALPHABET for char in code):
+        return None
+    short_id = (string_to_int(code, ALPHABET) - OFFSET) * INVERSE % CAPACITY
+    return short_id or None
@@ -1,26 +1,107 @@
-from typing import AsyncIterator
+import contextlib
+import time
 
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
 
+from core.metrics import db_latency
 from core.settings import Settings
+from db.memory import MemoryStorage
+from db.pool import InstrumentedQueuePool
+from db.postgres import PostgresStorage
+from db.replicas import ReplicaSet
+from db.storage import StorageBackend
 
 
 settings = Settings()
 
+CONSISTENT_READ_HEADER = 'X-Consistent-Read'
+
 
-def create_engine() -> AsyncEngine:
-    return create_async_engine(settings.DB_URL, echo=True, future=True)
+def create_engine(url: str | None = None) -> AsyncEngine:
+    return create_async_engine(
+        url or settings.DB_URL,
+        echo=settings.DB_ECHO,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE},
+    )
 
 
 def create_sessionmaker(bind_engine: AsyncEngine | AsyncConnection) -> sessionmaker:
     return sessionmaker(bind=bind_engine, expire_on_commit=False, class_=AsyncSession)
 
 
+def instrument_engine(bind_engine: AsyncEngine) -> None:
+    sync_engine = bind_engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is not None:
+            db_latency.observe(time.perf_counter() - started, statement.lstrip().split(None, 1)[0].upper())
+
+
+def create_replica_set(urls: Sequence[str]) -> ReplicaSet | None:
+    if not urls:
+        return None
+    engines = [create_engine(url) for url in urls]
+    for replica_engine in engines:
+        instrument_engine(replica_engine)
+    return ReplicaSet([(replica_engine, create_sessionmaker(replica_engine)) for replica_engine in engines],
+                      selection=settings.DB_REPLICA_SELECTION)
+
+
+def create_storage(session_factory: sessionmaker, replica_set: ReplicaSet | None = None) -> StorageBackend:
+    if settings.STORAGE_BACKEND == 'postgres':
+        return PostgresStorage(session_factory, read_session_factory=replica_set.session if replica_set else None)
+    if settings.STORAGE_BACKEND == 'memory':
+        return MemoryStorage()
+    raise ValueError(f'Unknown storage backend {settings.STORAGE_BACKEND!r}.')
+
+
 engine = create_engine()
+instrument_engine(engine)
 async_session = create_sessionmaker(engine)
+replica_set = create_replica_set(settings.replica_urls)
+storage = create_storage(async_session, replica_set)
+
+
+def pool_stats(bind_engine: AsyncEngine | None = None) -> dict:
+    pool = (bind_engine or engine).sync_engine.pool
+    return pool.stats() if isinstance(pool, InstrumentedQueuePool) else {'status': pool.status()}
+
+
+async def warm_pool(size: int, bind_engine: AsyncEngine | None = None) -> None:
+    # Connections are opened up front and all held at once, so that the pool keeps size of them
+    # and the first requests don't pay for connecting.
+    bind_engine = bind_engine or engine
+    async with contextlib.AsyncExitStack() as stack:
+        for _ in range(size):
+            await stack.enter_async_context(bind_engine.connect())
 
 
 async def get_session() -> AsyncIterator[AsyncSession]:
-    async with async_session() as session:
-        yield session
\ No newline at end of file
+    async with storage.session() as session:
+        yield session
+
+
+async def get_read_session(request: Request) -> AsyncIterator[AsyncSession]:
+    # For routes that only read. Replicas may lag behind, a client that has to see its own writes
+    # sends the CONSISTENT_READ_HEADER and is served by the primary.
+    session_factory = storage.session if request.headers.get(CONSISTENT_READ_HEADER) else storage.read_session
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,43 @@
+import json
+
+from typing import Any, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: ClauseElement) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def compile_explain(element: Explain, compiler: Any, **kwargs: Any) -> str:
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kwargs)
+
+
+def collect_indexes(plan: dict) -> Set[str]:
+    indexes = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        indexes |= collect_indexes(child)
+    return indexes
+
+
+async def used_indexes(db: AsyncSession, statement: ClauseElement, *, force_index: bool = True) -> Set[str]:
+    # Tiny or freshly created tables are always seq-scanned, so the check disables
+    # seq scans on the connection to see which index the planner would pick.
+    if force_index:
+        await db.execute(text('SET enable_seqscan = off'))
+    try:
+        result = await db.execute(Explain(statement))
+        plan = result.scalar_one()
+    finally:
+        if force_index:
+            await db.execute(text('RESET enable_seqscan'))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return collect_indexes(plan[0]['Plan'])
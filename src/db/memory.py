@@ -0,0 +1,365 @@
+import bisect
+import contextlib
+import itertools
+import uuid
+
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import (Any, AsyncContextManager, AsyncIterator, Dict, Iterable,
+                    List, Sequence, Tuple, Type)
+from uuid import UUID
+
+from sqlalchemy import Sequence as SequenceDefault
+from sqlalchemy.exc import IntegrityError
+
+from core.hyperloglog import HyperLogLog
+from db.pagination import decode_cursor
+from db.storage import (EXPORT_COLUMNS, Buckets, Sketches, StorageBackend,
+                        Totals)
+from models.models import ClickBucketModel, StatusModel, UrlModel
+
+
+Key = Tuple[datetime, UUID]
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class _OrderedLog:
+    # Rows kept in (created_at, id) order. Rows nearly always arrive in order
+    # and are appended, late ones are inserted in place; a cursor or a time
+    # range is a binary search.
+
+    def __init__(self) -> None:
+        self.keys: List[Key] = []
+        self.rows: List[Any] = []
+
+    def add(self, row: Any) -> None:
+        key = (row.created_at, row.id)
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.rows.append(row)
+        else:
+            index = bisect.bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.rows.insert(index, row)
+
+    def after(self, cursor: str | None) -> int:
+        if not cursor:
+            return 0
+        return bisect.bisect_right(self.keys, decode_cursor(cursor))
+
+    def between(self, since: datetime | None,
+                until: datetime | None) -> Tuple[int, int]:
+        # (moment,) sorts before every (moment, id), so these bound
+        # created_at only.
+        start = bisect.bisect_left(self.keys, (since,)) if since else 0
+        end = (bisect.bisect_left(self.keys, (until,)) if until
+               else len(self.keys))
+        return start, end
+
+
+def floor(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if granularity in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def page(rows: Iterable[Any], *, skip: int, limit: int,
+         cursor: str | None) -> List[Any]:
+    # A cursor has already been applied by the caller, skip is only honoured
+    # without one.
+    if cursor:
+        skip = 0
+    return list(itertools.islice(rows, skip, skip + limit))
+
+
+def in_range(moment: datetime, since: datetime | None,
+             until: datetime | None) -> bool:
+    return (not since or moment >= since) and (not until or moment < until)
+
+
+class _Table:
+
+    def __init__(self, model: Type) -> None:
+        self.model = model
+        self.columns = model.__table__.columns
+        self.rows: Dict[UUID, Any] = {}
+        self.unique: Dict[str, Dict[Any, Any]] = {
+            column.name: {} for column in self.columns if column.unique}
+        self.sequences = {
+            column.name: itertools.count(1) for column in self.columns
+            if isinstance(column.default, SequenceDefault)}
+        self.log = _OrderedLog()
+
+    def build(self, row: Dict[str, Any]) -> Any:
+        # Fills in what the database would: Python and sequence defaults and
+        # created_at.
+        values = dict(row)
+        for column in self.columns:
+            if values.get(column.name) is not None:
+                continue
+            if column.name in self.sequences:
+                values[column.name] = next(self.sequences[column.name])
+            elif column.default is not None and column.default.is_scalar:
+                values[column.name] = column.default.arg
+            elif column.default is not None and column.default.is_callable:
+                values[column.name] = column.default.arg(None)
+        if values.get('created_at') is None:
+            values['created_at'] = now()
+        return self.model(**values)
+
+    def conflict(self, values: Dict[str, Any],
+                 id: UUID | None = None) -> str | None:
+        for column, index in self.unique.items():
+            existing = index.get(values.get(column))
+            if existing is not None and existing.id != id:
+                return column
+        return None
+
+    def add(self, obj: Any) -> None:
+        column = self.conflict(
+            {column: getattr(obj, column) for column in self.unique})
+        if column:
+            raise IntegrityError('INSERT', None, ValueError(
+                f'Duplicate key value for '
+                f'{self.model.__tablename__}.{column}.'))
+        self.rows[obj.id] = obj
+        for column, index in self.unique.items():
+            index[getattr(obj, column)] = obj
+        self.log.add(obj)
+
+    def find(self, values: Dict[str, Any],
+             columns: Sequence[str]) -> Any | None:
+        for column in columns:
+            existing = self.unique[column].get(values.get(column))
+            if existing is not None:
+                return existing
+        return None
+
+
+class MemoryStorage(StorageBackend):
+    # Everything lives in this process: dict indexes for rows and unique
+    # columns, append-only ordered logs for clicks. Calls never await, so each
+    # one is atomic on the event loop, and there is nothing to commit or roll
+    # back. Sessions are not needed and are handed out as None.
+
+    def __init__(self) -> None:
+        self._tables: Dict[Type, _Table] = {}
+        self._statuses = _OrderedLog()
+        self._statuses_by_url: Dict[UUID, _OrderedLog] = defaultdict(
+            _OrderedLog)
+        self._statuses_by_user: Dict[UUID, _OrderedLog] = defaultdict(
+            _OrderedLog)
+        self._counts: Dict[UUID, int] = defaultdict(int)
+        self._buckets: Dict[Tuple[UUID, str], Dict[datetime, int]] = (
+            defaultdict(lambda: defaultdict(int)))
+        self._sketches: Dict[Tuple[UUID, str, str],
+                             Dict[datetime, HyperLogLog]] = defaultdict(dict)
+
+    def table(self, model: Type) -> _Table:
+        if model not in self._tables:
+            self._tables[model] = _Table(model)
+        return self._tables[model]
+
+    def session(self) -> AsyncContextManager[None]:
+        return contextlib.nullcontext()
+
+    async def commit(self, db: None) -> None:
+        pass
+
+    async def rollback(self, db: None) -> None:
+        pass
+
+    async def version(self, db: None) -> str:
+        return 'memory'
+
+    async def get_by(self, db: None, model: Type, column: str,
+                     value: Any) -> Any | None:
+        table = self.table(model)
+        obj = (table.rows.get(value) if column == 'id'
+               else table.unique[column].get(value))
+        return obj if obj is not None and not obj.is_delete else None
+
+    async def list(self, db: None, model: Type, *, skip=0, limit=100,
+                   cursor: str | None = None) -> List[Any]:
+        log = self.table(model).log
+        rows = (obj for obj in itertools.islice(log.rows, log.after(cursor),
+                                                None)
+                if not obj.is_delete)
+        return page(rows, skip=skip, limit=limit, cursor=cursor)
+
+    async def insert(self, db: None, model: Type,
+                     row: Dict[str, Any]) -> Any:
+        table = self.table(model)
+        obj = table.build(row)
+        table.add(obj)
+        return obj
+
+    async def insert_many(self, db: None, model: Type,
+                          rows: Sequence[Dict[str, Any]],
+                          conflict_columns: Sequence[str] = ()) -> List[Any]:
+        table = self.table(model)
+        data = []
+        for row in rows:
+            obj = (table.find(row, conflict_columns) if conflict_columns
+                   else None)
+            if obj is None:
+                obj = table.build(row)
+                table.add(obj)
+            elif getattr(obj, 'is_delete', False):
+                obj.is_delete = False
+                obj.updated_at = now()
+            data.append(obj)
+        return data
+
+    async def update(self, db: None, model: Type, id: UUID,
+                     values: Dict[str, Any]) -> Any | None:
+        table = self.table(model)
+        obj = table.rows.get(id)
+        if obj is None or obj.is_delete:
+            return None
+        if column := table.conflict(values, id):
+            raise IntegrityError('UPDATE', None, ValueError(
+                f'Duplicate key value for {model.__tablename__}.{column}.'))
+
+        for column, value in values.items():
+            if column in table.unique:
+                del table.unique[column][getattr(obj, column)]
+                table.unique[column][value] = obj
+            setattr(obj, column, value)
+        obj.updated_at = now()
+        return obj
+
+    async def hot_urls(self, db: None, limit: int) -> List[UrlModel]:
+        rows = self.table(UrlModel).rows
+        hot = (rows.get(url_id) for url_id, _ in
+               sorted(self._counts.items(), key=lambda item: -item[1]))
+        return list(itertools.islice(
+            (obj for obj in hot if obj is not None and not obj.is_delete),
+            limit))
+
+    async def scan_urls(self, db: None, *, since: datetime | None,
+                        batch_size: int
+                        ) -> AsyncIterator[List[Tuple[UUID, int, datetime]]]:
+        rows = [(obj.id, obj.short_id,
+                 max(obj.created_at, obj.updated_at or obj.created_at))
+                for obj in self.table(UrlModel).rows.values()
+                if not obj.is_delete]
+        if since is not None:
+            rows = [row for row in rows if row[2] >= since]
+        for offset in range(0, len(rows), batch_size):
+            yield rows[offset:offset + batch_size]
+
+    async def add_statuses(self, db: None,
+                           rows: Sequence[Dict[str, Any]]) -> None:
+        for row in rows:
+            obj = StatusModel(**row)
+            if obj.id is None:
+                obj.id = uuid.uuid4()
+            if obj.created_at is None:
+                obj.created_at = now()
+            self._statuses.add(obj)
+            self._statuses_by_url[obj.url_id].add(obj)
+            if obj.user_id is not None:
+                self._statuses_by_user[obj.user_id].add(obj)
+
+    async def get_statuses(self, db: None, *, url_id: UUID | None,
+                           user_id: UUID | None, host: str | None,
+                           request_methods: str | None,
+                           since: datetime | None = None,
+                           until: datetime | None = None, skip=0, limit=100,
+                           cursor: str | None = None) -> List[StatusModel]:
+        # The narrowest index is scanned, the remaining filters are checked
+        # row by row.
+        if url_id:
+            log = self._statuses_by_url.get(url_id, _OrderedLog())
+        elif user_id:
+            log = self._statuses_by_user.get(user_id, _OrderedLog())
+        else:
+            log = self._statuses
+
+        start, end = log.between(since, until)
+        start = max(start, log.after(cursor))
+        rows = (obj for obj in itertools.islice(log.rows, start, end)
+                if (not url_id or obj.url_id == url_id)
+                and (not user_id or obj.user_id == user_id)
+                and (not host or obj.host == host)
+                and (not request_methods
+                     or obj.request_methods == request_methods))
+        return page(rows, skip=skip, limit=limit, cursor=cursor)
+
+    async def export_statuses(self, db: None, *, url_id: UUID | None,
+                              since: datetime | None, until: datetime | None,
+                              batch_size: int) -> AsyncIterator[List[tuple]]:
+        log = (self._statuses_by_url.get(url_id, _OrderedLog()) if url_id
+               else self._statuses)
+        start, end = log.between(since, until)
+        # The range is copied up front, so the export is a snapshot of the
+        # moment it started.
+        rows = log.rows[start:end]
+        for offset in range(0, len(rows), batch_size):
+            yield [tuple(getattr(obj, column) for column in EXPORT_COLUMNS)
+                   for obj in rows[offset:offset + batch_size]]
+
+    def clicks_between(self, url_id: UUID, since: datetime,
+                       until: datetime) -> List[StatusModel]:
+        log = self._statuses_by_url.get(url_id, _OrderedLog())
+        start, end = log.between(since, until)
+        return log.rows[start:end]
+
+    async def count_by_bucket(self, db: None, url_id: UUID, granularity: str,
+                              since: datetime, until: datetime
+                              ) -> List[Tuple[datetime, int]]:
+        counts = Counter(floor(obj.created_at, granularity)
+                         for obj in self.clicks_between(url_id, since, until))
+        return sorted(counts.items())
+
+    async def top_hosts(self, db: None, url_id: UUID, since: datetime,
+                        until: datetime, limit: int) -> List[Tuple[str, int]]:
+        counts = Counter(obj.host
+                         for obj in self.clicks_between(url_id, since, until))
+        return sorted(counts.items(),
+                      key=lambda item: (-item[1], item[0]))[:limit]
+
+    async def add_counts(self, db: None, totals: Totals,
+                         buckets: Buckets) -> None:
+        for url_id, clicks in totals.items():
+            self._counts[url_id] += clicks
+        for (url_id, granularity, bucket_start), clicks in buckets.items():
+            self._buckets[(url_id, granularity)][bucket_start] += clicks
+
+    async def get_count(self, db: None, url_id: UUID) -> int:
+        return self._counts.get(url_id, 0)
+
+    async def get_buckets(self, db: None, url_id: UUID, granularity: str, *,
+                          since: datetime | None = None,
+                          until: datetime | None = None
+                          ) -> List[ClickBucketModel]:
+        buckets = self._buckets.get((url_id, granularity), {})
+        return [ClickBucketModel(url_id=url_id, granularity=granularity,
+                                 bucket_start=bucket_start, clicks=clicks)
+                for bucket_start, clicks in sorted(buckets.items())
+                if in_range(bucket_start, since, until)]
+
+    async def add_sketches(self, db: None, sketches: Sketches) -> None:
+        for key, sketch in sketches.items():
+            url_id, kind, granularity, bucket_start = key
+            stored = self._sketches[(url_id, kind, granularity)]
+            if bucket_start in stored:
+                stored[bucket_start].merge(sketch)
+            else:
+                stored[bucket_start] = HyperLogLog(sketch.precision,
+                                                   sketch.registers)
+
+    async def get_sketches(self, db: None, url_id: UUID, kind: str,
+                           granularity: str, *, since: datetime | None = None,
+                           until: datetime | None = None
+                           ) -> List[HyperLogLog]:
+        sketches = self._sketches.get((url_id, kind, granularity), {})
+        return [sketch for bucket_start, sketch in sketches.items()
+                if in_range(bucket_start, since, until)]
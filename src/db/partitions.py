@@ -0,0 +1,172 @@
+import asyncio
+import re
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from core.logger import logger
+from core.settings import settings
+from db.database import engine
+
+
+PARENT = 'statuses'
+DEFAULT = f'{PARENT}_default'
+INTERVALS = ('day', 'month')
+RETENTION_ACTIONS = ('drop', 'detach')
+
+# Serializes maintenance between workers and hosts sharing the database.
+LOCK_KEY = 0x5354415455534553
+
+_NAME = re.compile(rf'^{PARENT}_p(\d{{4}})_(\d{{2}})(?:_(\d{{2}}))?$')
+
+
+def partition_start(moment: datetime, interval: str) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, moment.day if interval == 'day' else 1, tzinfo=timezone.utc)
+
+
+def next_start(start: datetime, interval: str) -> datetime:
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: datetime, interval: str) -> str:
+    return f'{PARENT}_p{start:%Y_%m_%d}' if interval == 'day' else f'{PARENT}_p{start:%Y_%m}'
+
+
+def partition_bounds(name: str) -> Tuple[datetime, datetime] | None:
+    # Dated partitions carry their range in the name; the default partition and foreign tables have none.
+    if not (match := _NAME.match(name)):
+        return None
+    year, month, day = match.groups()
+    start = datetime(int(year), int(month), int(day or 1), tzinfo=timezone.utc)
+    return start, next_start(start, 'day' if day else 'month')
+
+
+class StatusPartitionManager:
+    # Keeps dated partitions of statuses created ahead of time and retires the expired ones.
+    # Rows only fall into the default partition when no dated one exists for them, and a dated
+    # partition can't be created over rows already in the default one, so creation runs ahead.
+    # When rows are there anyway (tables made by create_all, or maintenance that was off), they
+    # are moved into the new partition before it is attached.
+
+    def __init__(self, bind: AsyncEngine, *, interval: str, ahead: int, retention_days: int, retention_action: str,
+                 check_interval: float) -> None:
+        if interval not in INTERVALS:
+            raise ValueError(f'Unknown partition interval {interval!r}.')
+        if retention_action not in RETENTION_ACTIONS:
+            raise ValueError(f'Unknown retention action {retention_action!r}.')
+        self._bind = bind
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.retention_action = retention_action
+        self.check_interval = check_interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception:
+                logger.exception('Status partition maintenance failed.')
+            await asyncio.sleep(self.check_interval)
+
+    async def maintain(self, now: datetime | None = None) -> dict:
+        now = now or datetime.now(timezone.utc)
+        async with self._bind.begin() as conn:
+            await conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': LOCK_KEY})
+            attached = await self.attached(conn)
+            created = await self.create_ahead(conn, now, attached)
+            retired = await self.retire(conn, now, attached)
+        if created or retired:
+            logger.info('Status partitions created: %s, retired (%s): %s.', created, self.retention_action, retired)
+        return {'created': created, 'retired': retired}
+
+    async def attached(self, conn: AsyncConnection) -> List[str]:
+        result = await conn.execute(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'WHERE parent.relname = :parent ORDER BY child.relname'), {'parent': PARENT})
+        return list(result.scalars())
+
+    async def create_ahead(self, conn: AsyncConnection, now: datetime, attached: List[str]) -> List[str]:
+        created = []
+        start = partition_start(now, self.interval)
+        for _ in range(self.ahead + 1):
+            end = next_start(start, self.interval)
+            name = partition_name(start, self.interval)
+            if name not in attached:
+                try:
+                    async with conn.begin_nested():
+                        await self.create_partition(conn, name, start, end, DEFAULT in attached)
+                except SQLAlchemyError:
+                    # Overlaps a partition of the other interval.
+                    logger.exception('Could not create status partition %s.', name)
+                else:
+                    created.append(name)
+            start = end
+        return created
+
+    async def create_partition(self, conn: AsyncConnection, name: str, start: datetime, end: datetime,
+                               has_default: bool) -> None:
+        bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        in_range = {'start': start, 'end': end}
+        if has_default:
+            # Locked first, so no row for the range can land in the default partition until the new one is attached.
+            await conn.execute(text(f'LOCK TABLE {DEFAULT} IN ACCESS EXCLUSIVE MODE'))
+            stranded = await conn.execute(text(
+                f'SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE created_at >= :start AND created_at < :end)'), in_range)
+            if stranded.scalar():
+                await conn.execute(text(f'CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)'))
+                result = await conn.execute(text(
+                    f'WITH moved AS (DELETE FROM {DEFAULT} WHERE created_at >= :start AND created_at < :end RETURNING *) '
+                    f'INSERT INTO {name} SELECT * FROM moved'), in_range)
+                await conn.execute(text(f'ALTER TABLE {PARENT} ATTACH PARTITION {name} {bounds}'))
+                logger.info('Moved %s statuses from %s into %s.', result.rowcount, DEFAULT, name)
+                return
+        await conn.execute(text(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} {bounds}'))
+
+    async def retire(self, conn: AsyncConnection, now: datetime, attached: List[str]) -> List[str]:
+        if self.retention_days <= 0:
+            return []
+
+        cutoff = now - timedelta(days=self.retention_days)
+        retired = []
+        for name in attached:
+            bounds = partition_bounds(name)
+            if bounds is None or bounds[1] > cutoff:
+                continue
+            if self.retention_action == 'drop':
+                await conn.execute(text(f'DROP TABLE {name}'))
+            else:
+                # The detached table stays behind as a plain table, to be archived and dropped by the operator.
+                await conn.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION {name}'))
+            retired.append(name)
+        return retired
+
+
+status_partitions = StatusPartitionManager(
+    engine, interval=settings.STATUS_PARTITION_INTERVAL, ahead=settings.STATUS_PARTITIONS_AHEAD,
+    retention_days=settings.STATUS_RETENTION_DAYS, retention_action=settings.STATUS_RETENTION_ACTION,
+    check_interval=settings.STATUS_PARTITION_CHECK_INTERVAL)
@@ -0,0 +1,45 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Checkout time covers both waiting for a free connection and opening an overflow one.
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_time += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def stats(self) -> dict:
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        return {
+            'size': self.size(),
+            'max_overflow': self._max_overflow,
+            'checked_in': self.checkedin(),
+            'checked_out': checked_out,
+            'overflow': self.overflow(),
+            'saturation': checked_out / capacity if capacity else 0.0,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_time_total': self.wait_time,
+            'wait_time_avg': self.wait_time / self.checkouts if self.checkouts else 0.0,
+            'wait_time_max': self.max_wait,
+        }
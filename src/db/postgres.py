@@ -0,0 +1,391 @@
+from datetime import datetime
+from typing import (Any, AsyncContextManager, AsyncIterator, Callable, Dict,
+                    List, Sequence, Tuple, Type)
+from uuid import UUID
+
+from sqlalchemy import (bindparam, func, insert as plain_insert,
+                        literal_column, or_, select, tuple_, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.sql import Select
+
+from core.settings import settings
+from core.hyperloglog import HyperLogLog
+from db.pagination import paginate
+from db.storage import (EXPORT_COLUMNS, Buckets, Sketches, StorageBackend,
+                        Totals)
+from models.models import (ClickBucketModel, ClickCounterModel, StatusModel,
+                           UrlModel, UrlSketchModel)
+
+
+SKETCH_KEY = ('url_id', 'kind', 'granularity', 'bucket_start')
+
+
+class PostgresStorage(StorageBackend):
+
+    def __init__(self, session_factory: Callable[[], AsyncSession],
+                 read_session_factory: Callable[
+                     [], AsyncContextManager[AsyncSession]] | None = None
+                 ) -> None:
+        self._session_factory = session_factory
+        self._read_session_factory = read_session_factory or session_factory
+
+    def session(self) -> AsyncContextManager[AsyncSession]:
+        return self._session_factory()
+
+    def read_session(self) -> AsyncContextManager[AsyncSession]:
+        return self._read_session_factory()
+
+    def target(self, db: AsyncSession) -> AsyncEngine:
+        # The primary or the replica engine the session is bound to.
+        return db.bind
+
+    async def commit(self, db: AsyncSession) -> None:
+        await db.commit()
+
+    async def rollback(self, db: AsyncSession) -> None:
+        await db.rollback()
+
+    async def version(self, db: AsyncSession) -> str:
+        result = await db.execute(select(func.version()))
+        return result.scalar_one()
+
+    def lookup_statement(self, model: Type, column: str,
+                         value: Any) -> Select:
+        return (select(model).where(getattr(model, column) == value)
+                .where(model.is_delete.is_(False)))
+
+    async def get_by(self, db: AsyncSession, model: Type, column: str,
+                     value: Any) -> Any | None:
+        obj = await db.execute(
+            statement=self.lookup_statement(model, column, value))
+        return obj.scalar_one_or_none()
+
+    def list_statement(self, model: Type, *, skip=0, limit=100,
+                       cursor: str | None = None) -> Select:
+        statement = select(model).where(model.is_delete.is_(False))
+        return paginate(statement, model, cursor=cursor, skip=skip,
+                        limit=limit)
+
+    async def list(self, db: AsyncSession, model: Type, *, skip=0, limit=100,
+                   cursor: str | None = None) -> List[Any]:
+        obj = await db.execute(statement=self.list_statement(
+            model, skip=skip, limit=limit, cursor=cursor))
+        return obj.scalars().all()
+
+    async def insert(self, db: AsyncSession, model: Type,
+                     row: Dict[str, Any]) -> Any:
+        db_data = model(**row)
+        db.add(db_data)
+        await db.flush()
+        await db.refresh(db_data)
+        return db_data
+
+    async def insert_many(self, db: AsyncSession, model: Type,
+                          rows: Sequence[Dict[str, Any]],
+                          conflict_columns: Sequence[str] = ()) -> List[Any]:
+        chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+        data = []
+        for start in range(0, len(rows), chunk_size):
+            data.extend(await self._insert_rows(
+                db, model, rows[start:start + chunk_size], conflict_columns))
+        return data
+
+    async def _insert_rows(self, db: AsyncSession, model: Type,
+                           rows: Sequence[Dict[str, Any]],
+                           conflict_columns: Sequence[str]) -> List[Any]:
+        if not rows:
+            return []
+
+        def key(row: Any) -> tuple:
+            return tuple(row[column] if isinstance(row, dict)
+                         else getattr(row, column)
+                         for column in conflict_columns)
+
+        # ON CONFLICT DO UPDATE can't touch a row twice in one statement,
+        # so repeated rows go in once.
+        unique = (list({key(row): row for row in rows}.values())
+                  if conflict_columns else list(rows))
+        table = model.__table__
+        statement = insert(model).values(unique)
+        if conflict_columns and 'is_delete' in table.columns:
+            # Soft deleted rows are revived and returned, live ones are left
+            # alone.
+            statement = statement.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={'is_delete': False,
+                      'updated_at': func.current_timestamp()},
+                where=table.c.is_delete.is_(True))
+        elif conflict_columns:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=list(conflict_columns))
+        statement = select(model).from_statement(
+            statement.returning(*table.columns))
+        result = await db.execute(
+            statement.execution_options(populate_existing=True))
+        inserted = result.scalars().all()
+        if not conflict_columns:
+            return inserted
+
+        # Rows skipped by ON CONFLICT are not returned, so the already stored
+        # ones are read back and everything is handed out in the order of the
+        # input rows.
+        by_key = {key(db_data): db_data for db_data in inserted}
+        missing = {key(row) for row in rows} - by_key.keys()
+        if missing:
+            columns = [getattr(model, column) for column in conflict_columns]
+            statement = select(model).where(
+                tuple_(*columns).in_(list(missing)))
+            result = await db.execute(statement)
+            by_key.update((key(db_data), db_data)
+                          for db_data in result.scalars().all())
+        return [by_key[key(row)] for row in rows]
+
+    async def update(self, db: AsyncSession, model: Type, id: UUID,
+                     values: Dict[str, Any]) -> Any | None:
+        statement = (update(model).where(model.id == id)
+                     .where(model.is_delete.is_(False)))
+        statement = statement.values(values).returning(model)
+        result = await db.execute(statement=statement)
+        return result.one_or_none()
+
+    async def hot_urls(self, db: AsyncSession,
+                       limit: int) -> List[UrlModel]:
+        statement = select(UrlModel).join(
+            ClickCounterModel, ClickCounterModel.url_id == UrlModel.id)
+        statement = (statement.where(UrlModel.is_delete.is_(False))
+                     .order_by(ClickCounterModel.clicks.desc()).limit(limit))
+        result = await db.execute(statement=statement)
+        return result.scalars().all()
+
+    async def scan_urls(self, db: AsyncSession, *, since: datetime | None,
+                        batch_size: int
+                        ) -> AsyncIterator[List[Tuple[UUID, int, datetime]]]:
+        # greatest() skips the null updated_at of urls never updated.
+        changed_at = func.greatest(UrlModel.created_at, UrlModel.updated_at)
+        statement = (select(UrlModel.id, UrlModel.short_id, changed_at)
+                     .where(UrlModel.is_delete.is_(False)))
+        if since:
+            statement = statement.where(or_(UrlModel.created_at >= since,
+                                            UrlModel.updated_at >= since))
+        result = await db.stream(
+            statement.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            yield [tuple(row) for row in rows]
+
+    async def add_statuses(self, db: AsyncSession,
+                           rows: Sequence[Dict[str, Any]]) -> None:
+        if rows:
+            await db.execute(plain_insert(StatusModel).values(list(rows)))
+
+    def statuses_statement(self, url_id: UUID | None, user_id: UUID | None,
+                           host: str | None, request_methods: str | None,
+                           since: datetime | None = None,
+                           until: datetime | None = None) -> Select:
+        statement = select(StatusModel)
+
+        # Bounds on created_at restrict the scan to the matching partitions.
+        if since:
+            statement = statement.filter(StatusModel.created_at >= since)
+        if until:
+            statement = statement.filter(StatusModel.created_at < until)
+        if host:
+            statement = statement.filter(StatusModel.host == host)
+        if request_methods:
+            statement = statement.filter(
+                StatusModel.request_methods == request_methods)
+        if url_id:
+            statement = statement.filter(StatusModel.url_id == url_id)
+        if user_id:
+            statement = statement.filter(StatusModel.user_id == user_id)
+        return statement
+
+    async def get_statuses(self, db: AsyncSession, *, url_id: UUID | None,
+                           user_id: UUID | None, host: str | None,
+                           request_methods: str | None,
+                           since: datetime | None = None,
+                           until: datetime | None = None, skip=0, limit=100,
+                           cursor: str | None = None) -> List[StatusModel]:
+        statement = self.statuses_statement(url_id, user_id, host,
+                                            request_methods, since, until)
+        statement = paginate(statement, StatusModel, cursor=cursor,
+                             skip=skip, limit=limit)
+        obj = await db.execute(statement=statement)
+        return obj.scalars().all()
+
+    def export_statement(self, url_id: UUID | None, since: datetime | None,
+                         until: datetime | None) -> Select:
+        statement = select(*(getattr(StatusModel, column)
+                             for column in EXPORT_COLUMNS))
+        if url_id:
+            statement = statement.filter(StatusModel.url_id == url_id)
+        if since:
+            statement = statement.filter(StatusModel.created_at >= since)
+        if until:
+            statement = statement.filter(StatusModel.created_at < until)
+        return statement.order_by(StatusModel.created_at, StatusModel.id)
+
+    async def export_statuses(self, db: AsyncSession, *, url_id: UUID | None,
+                              since: datetime | None, until: datetime | None,
+                              batch_size: int) -> AsyncIterator[List[tuple]]:
+        # Rows are fetched through a server-side cursor, yield_per rows at a
+        # time.
+        statement = self.export_statement(url_id, since, until)
+        result = await db.stream(
+            statement.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            yield [tuple(row) for row in rows]
+
+    def range_statement(self, *columns: Any, url_id: UUID, since: datetime,
+                        until: datetime) -> Select:
+        return (select(*columns).where(StatusModel.url_id == url_id)
+                .where(StatusModel.created_at >= since)
+                .where(StatusModel.created_at < until))
+
+    async def count_by_bucket(
+            self, db: AsyncSession, url_id: UUID, granularity: str,
+            since: datetime, until: datetime) -> List[Tuple[datetime, int]]:
+        # Literals are inlined rather than bound: with parameters in both the
+        # select list and the GROUP BY, Postgres can't tell the two
+        # expressions are the same.
+        if granularity not in ('minute', 'hour', 'day'):
+            raise ValueError(f'Unknown granularity {granularity!r}.')
+        utc = literal_column("'UTC'")
+        bucket = func.timezone(utc, func.date_trunc(
+            literal_column(f"'{granularity}'"),
+            func.timezone(utc, StatusModel.created_at)))
+        statement = self.range_statement(
+            bucket.label('bucket_start'), func.count(), url_id=url_id,
+            since=since, until=until)
+        result = await db.execute(
+            statement.group_by(bucket).order_by(bucket))
+        return [tuple(row) for row in result]
+
+    async def top_hosts(self, db: AsyncSession, url_id: UUID,
+                        since: datetime, until: datetime,
+                        limit: int) -> List[Tuple[str, int]]:
+        clicks = func.count().label('clicks')
+        statement = self.range_statement(StatusModel.host, clicks,
+                                         url_id=url_id, since=since,
+                                         until=until)
+        statement = (statement.group_by(StatusModel.host)
+                     .order_by(clicks.desc(), StatusModel.host).limit(limit))
+        result = await db.execute(statement)
+        return [tuple(row) for row in result]
+
+    async def add_counts(self, db: AsyncSession, totals: Totals,
+                         buckets: Buckets) -> None:
+        if not totals:
+            return
+
+        # Rows are upserted in key order so that concurrent flushers lock them
+        # in the same order.
+        statement = insert(ClickCounterModel).values(
+            [{'url_id': url_id, 'clicks': clicks}
+             for url_id, clicks in sorted(totals.items(),
+                                          key=lambda item: str(item[0]))])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ClickCounterModel.url_id],
+            set_={'clicks': ClickCounterModel.clicks
+                  + statement.excluded.clicks,
+                  'updated_at': func.current_timestamp()})
+        await db.execute(statement)
+
+        statement = insert(ClickBucketModel).values(
+            [{'url_id': url_id, 'granularity': granularity,
+              'bucket_start': bucket_start, 'clicks': clicks}
+             for (url_id, granularity, bucket_start), clicks
+             in sorted(buckets.items(), key=lambda item: str(item[0]))])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ClickBucketModel.url_id,
+                            ClickBucketModel.granularity,
+                            ClickBucketModel.bucket_start],
+            set_={'clicks': ClickBucketModel.clicks
+                  + statement.excluded.clicks})
+        await db.execute(statement)
+
+    async def get_count(self, db: AsyncSession, url_id: UUID) -> int:
+        statement = select(ClickCounterModel.clicks).where(
+            ClickCounterModel.url_id == url_id)
+        result = await db.execute(statement=statement)
+        return result.scalar_one_or_none() or 0
+
+    async def get_buckets(self, db: AsyncSession, url_id: UUID,
+                          granularity: str, *, since: datetime | None = None,
+                          until: datetime | None = None
+                          ) -> List[ClickBucketModel]:
+        statement = select(ClickBucketModel).where(
+            ClickBucketModel.url_id == url_id)
+        statement = statement.where(
+            ClickBucketModel.granularity == granularity)
+        if since:
+            statement = statement.where(ClickBucketModel.bucket_start >= since)
+        if until:
+            statement = statement.where(ClickBucketModel.bucket_start < until)
+        statement = statement.order_by(ClickBucketModel.bucket_start)
+
+        result = await db.execute(statement=statement)
+        return result.scalars().all()
+
+    async def add_sketches(self, db: AsyncSession,
+                           sketches: Sketches) -> None:
+        # Registers can't be merged in SQL, so stored sketches are read,
+        # merged and written back. Keys are handled in primary key order,
+        # which the alphabetical enums make the same as the Python sort, so
+        # concurrent flushers lock the rows in the same order.
+        keys = sorted(sketches, key=lambda key: (str(key[0]), *key[1:]))
+        chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+        for start in range(0, len(keys), chunk_size):
+            await self._add_sketches(db, keys[start:start + chunk_size],
+                                     sketches)
+
+    async def _add_sketches(self, db: AsyncSession, keys: Sequence[tuple],
+                            sketches: Sketches) -> None:
+        table = UrlSketchModel.__table__
+        columns = [table.c[column] for column in SKETCH_KEY]
+
+        # Missing sketches are stored as they are, conflicting inserts wait
+        # for the concurrent ones and are skipped.
+        statement = insert(table).values(
+            [{**dict(zip(SKETCH_KEY, key)),
+              'registers': sketches[key].to_bytes()} for key in keys])
+        result = await db.execute(
+            statement.on_conflict_do_nothing().returning(*columns))
+        existing = set(keys) - {tuple(row) for row in result}
+        if not existing:
+            return
+
+        statement = (select(table).where(tuple_(*columns).in_(list(existing)))
+                     .order_by(*columns).with_for_update())
+        result = await db.execute(statement)
+        merged = []
+        for row in result:
+            key = tuple(row._mapping[column] for column in SKETCH_KEY)
+            sketch = HyperLogLog.from_bytes(row.registers).merge(
+                sketches[key])
+            merged.append({**{f'b_{column}': value
+                              for column, value in zip(SKETCH_KEY, key)},
+                           'b_registers': sketch.to_bytes()})
+
+        statement = update(table).values(registers=bindparam('b_registers'))
+        for column in columns:
+            statement = statement.where(
+                column == bindparam(f'b_{column.name}'))
+        await db.execute(statement, merged)
+
+    async def get_sketches(self, db: AsyncSession, url_id: UUID, kind: str,
+                           granularity: str, *, since: datetime | None = None,
+                           until: datetime | None = None
+                           ) -> List[HyperLogLog]:
+        statement = select(UrlSketchModel.registers).where(
+            UrlSketchModel.url_id == url_id)
+        statement = (statement.where(UrlSketchModel.kind == kind)
+                     .where(UrlSketchModel.granularity == granularity))
+        if since:
+            statement = statement.where(UrlSketchModel.bucket_start >= since)
+        if until:
+            statement = statement.where(UrlSketchModel.bucket_start < until)
+
+        result = await db.execute(statement=statement)
+        return [HyperLogLog.from_bytes(registers)
+                for registers in result.scalars()]
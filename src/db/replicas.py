@@ -0,0 +1,39 @@
+import itertools
+
+from typing import AsyncContextManager, Callable, List, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+SELECTIONS = ('round_robin', 'least_loaded')
+
+Replica = Tuple[AsyncEngine, Callable[[], AsyncContextManager[AsyncSession]]]
+
+
+class ReplicaSet:
+    # Hands out read-only sessions on replica engines, taking turns or picking the one with the fewest
+    # checked out connections (ties are broken by turns, so an idle set is still spread evenly).
+
+    def __init__(self, replicas: Sequence[Replica], selection: str = 'round_robin') -> None:
+        if not replicas:
+            raise ValueError('A replica set needs at least one replica.')
+        if selection not in SELECTIONS:
+            raise ValueError(f'Unknown replica selection {selection!r}.')
+        self.replicas = list(replicas)
+        self.selection = selection
+        self._turns = itertools.count()
+
+    @property
+    def engines(self) -> List[AsyncEngine]:
+        return [engine for engine, _ in self.replicas]
+
+    def choose(self) -> int:
+        turn = next(self._turns) % len(self.replicas)
+        if self.selection == 'round_robin':
+            return turn
+        order = [(turn + offset) % len(self.replicas) for offset in range(len(self.replicas))]
+        return min(order, key=lambda index: self.replicas[index][0].sync_engine.pool.checkedout())
+
+    def session(self) -> AsyncContextManager[AsyncSession]:
+        _, session_factory = self.replicas[self.choose()]
+        return session_factory()
@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, Hashable, List, Mapping, Sequence, Tuple, Type
+from uuid import UUID
+
+from core.hyperloglog import HyperLogLog
+
+# Columns of an exported status row, in order.
+EXPORT_COLUMNS = ('id', 'created_at', 'url_id', 'user_id', 'host', 'request_methods')
+
+# url_id -> clicks and (url_id, granularity, bucket_start) -> clicks.
+Totals = Mapping[UUID, int]
+Buckets = Mapping[Tuple[UUID, str, datetime], int]
+# (url_id, kind, granularity, bucket_start) -> sketch of the distinct users or hosts.
+Sketches = Mapping[Tuple[UUID, str, str, datetime], HyperLogLog]
+
+
+class StorageBackend:
+    # Persistence used by the services. Every call takes the session handed out by session(),
+    # writes become visible to other sessions after commit().
+
+    def session(self) -> AsyncContextManager[Any]:
+        raise NotImplementedError
+
+    def read_session(self) -> AsyncContextManager[Any]:
+        # A session for reads only, which may be served by a lagging replica.
+        return self.session()
+
+    def target(self, db: Any) -> Hashable:
+        # The database a session reads from: sessions on the same one see the same committed rows.
+        return None
+
+    async def commit(self, db: Any) -> None:
+        raise NotImplementedError
+
+    async def rollback(self, db: Any) -> None:
+        raise NotImplementedError
+
+    async def version(self, db: Any) -> str:
+        raise NotImplementedError
+
+    async def get(self, db: Any, model: Type, id: UUID) -> Any | None:
+        return await self.get_by(db, model, 'id', id)
+
+    async def get_by(self, db: Any, model: Type, column: str, value: Any) -> Any | None:
+        # Only rows that are not soft deleted are returned.
+        raise NotImplementedError
+
+    async def list(self, db: Any, model: Type, *, skip: int = 0, limit: int = 100, cursor: str | None = None) -> List[Any]:
+        raise NotImplementedError
+
+    async def insert(self, db: Any, model: Type, row: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    async def insert_many(self, db: Any, model: Type, rows: Sequence[Dict[str, Any]], conflict_columns: Sequence[str] = ()) -> List[Any]:
+        # Rows conflicting on conflict_columns are not inserted, the stored ones are returned in their place.
+        # A stored row that was soft deleted is revived (is_delete set back to false).
+        raise NotImplementedError
+
+    async def update(self, db: Any, model: Type, id: UUID, values: Dict[str, Any]) -> Any | None:
+        raise NotImplementedError
+
+    async def hot_urls(self, db: Any, limit: int) -> List[Any]:
+        # Live urls with the most clicks first.
+        raise NotImplementedError
+
+    def scan_urls(self, db: Any, *, since: datetime | None, batch_size: int) -> AsyncIterator[List[Tuple[UUID, int, datetime]]]:
+        # Yields batches of (id, short_id, changed_at) of the live urls created or updated (revived too) from
+        # since on, unordered. changed_at is the later of created_at and updated_at.
+        raise NotImplementedError
+
+    async def add_statuses(self, db: Any, rows: Sequence[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def get_statuses(self, db: Any, *, url_id: UUID | None, user_id: UUID | None, host: str | None,
+                           request_methods: str | None, since: datetime | None = None, until: datetime | None = None,
+                           skip: int = 0, limit: int = 100, cursor: str | None = None) -> List[Any]:
+        raise NotImplementedError
+
+    def export_statuses(self, db: Any, *, url_id: UUID | None, since: datetime | None, until: datetime | None,
+                        batch_size: int) -> AsyncIterator[List[tuple]]:
+        # Yields batches of EXPORT_COLUMNS tuples ordered by (created_at, id).
+        raise NotImplementedError
+
+    async def count_by_bucket(self, db: Any, url_id: UUID, granularity: str, since: datetime,
+                              until: datetime) -> List[Tuple[datetime, int]]:
+        # Clicks per UTC minute/hour/day bucket, counted from the statuses themselves.
+        raise NotImplementedError
+
+    async def top_hosts(self, db: Any, url_id: UUID, since: datetime, until: datetime, limit: int) -> List[Tuple[str, int]]:
+        raise NotImplementedError
+
+    async def add_counts(self, db: Any, totals: Totals, buckets: Buckets) -> None:
+        raise NotImplementedError
+
+    async def get_count(self, db: Any, url_id: UUID) -> int:
+        raise NotImplementedError
+
+    async def get_buckets(self, db: Any, url_id: UUID, granularity: str, *, since: datetime | None = None,
+                          until: datetime | None = None) -> List[Any]:
+        raise NotImplementedError
+
+    async def add_sketches(self, db: Any, sketches: Sketches) -> None:
+        # Merged into the stored sketches, which are created when missing.
+        raise NotImplementedError
+
+    async def get_sketches(self, db: Any, url_id: UUID, kind: str, granularity: str, *, since: datetime | None = None,
+                           until: datetime | None = None) -> List[HyperLogLog]:
+        raise NotImplementedError
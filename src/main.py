@@ -1,12 +1,19 @@
-import uvicorn
-
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.responses import ORJSONResponse
 
-from api.v1 import base
+from api import metrics
+from api.v1 import base, requests
 from core.settings import Settings
 from core.logger import logger
-from middlewares.middleware import BannedHostsMiddleware
+from db.database import engine, replica_set, storage, warm_pool
+from db.pagination import InvalidCursor
+from db.partitions import status_partitions
+from middlewares.middleware import BannedHostsMiddleware, MetricsMiddleware, RateLimitMiddleware
+from middlewares.ratelimit import MemoryRateLimitBackend
+from services.clicks import click_ingestor
+from services.requests import request_service_db
+from services.shared_cache import shared_cache
+from services.url_filter import url_filter
 
 
 settings = Settings()
@@ -18,10 +25,110 @@ app = FastAPI(
     default_response_class=ORJSONResponse,)
 
 app.include_router(base.base_router, prefix='/api/v1')
+app.include_router(metrics.metrics_router)
+# Redirects bypass FastAPI's routing machinery, see api/v1/requests.py.
+app.router.routes.append(requests.redirect_route)
+
+rate_limit_backend = MemoryRateLimitBackend(sweep_interval=settings.RATE_LIMIT_SWEEP_INTERVAL)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, rules=settings.rate_limits, backend=rate_limit_backend)
+app.add_middleware(BannedHostsMiddleware, banned_hosts=settings.banned_hosts, banned_networks=settings.banned_networks,
+                   blocklist_file=settings.BANNED_HOSTS_FILE, reload_interval=settings.BANNED_HOSTS_RELOAD_INTERVAL)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor(request: Request, exc: InvalidCursor) -> ORJSONResponse:
+    return ORJSONResponse({'detail': 'Invalid cursor.'}, status_code=status.HTTP_400_BAD_REQUEST)
+
+
+@app.on_event('startup')
+async def warm_up() -> None:
+    # Runs before the worker takes traffic. Failures are logged, the worker then starts cold.
+    try:
+        if settings.STORAGE_BACKEND == 'postgres' and settings.DB_POOL_WARMUP:
+            for bind_engine in [engine, *(replica_set.engines if replica_set else [])]:
+                await warm_pool(settings.DB_POOL_SIZE, bind_engine)
+        if settings.REDIRECT_CACHE_WARMUP:
+            async with storage.read_session() as db:
+                cached = await request_service_db.warm_cache(db, settings.REDIRECT_CACHE_WARMUP)
+            logger.info('Redirect cache warmed with %s urls.', cached)
+    except Exception:
+        logger.exception('Warm up failed.')
+
+
+@app.on_event('startup')
+async def load_url_filter() -> None:
+    # Left unloaded on failure, then no key is ruled out. Read from the primary like the refreshes, as a
+    # lagging replica would leave out the newest urls.
+    if url_filter is None:
+        return
+    try:
+        async with storage.session() as db:
+            await url_filter.load(db)
+        logger.info('Url filter loaded with %s keys.', url_filter.filter.count)
+    except Exception:
+        logger.exception('Loading the url filter failed.')
+
+
+@app.on_event('startup')
+async def start_url_filter_rebuild() -> None:
+    if url_filter is not None:
+        await url_filter.start(storage.session)
+
+
+@app.on_event('shutdown')
+async def stop_url_filter_rebuild() -> None:
+    if url_filter is not None:
+        await url_filter.stop()
+
+
+@app.on_event('startup')
+async def start_rate_limit_sweep() -> None:
+    if settings.RATE_LIMIT_ENABLED:
+        await rate_limit_backend.start()
+
+
+@app.on_event('shutdown')
+async def stop_rate_limit_sweep() -> None:
+    await rate_limit_backend.stop()
+
+
+@app.on_event('startup')
+async def start_click_ingestor() -> None:
+    await click_ingestor.start()
+
+
+@app.on_event('shutdown')
+async def stop_click_ingestor() -> None:
+    await click_ingestor.stop()
+
+
+@app.on_event('startup')
+async def start_status_partitions() -> None:
+    if settings.STORAGE_BACKEND == 'postgres':
+        await status_partitions.start()
+
+
+@app.on_event('shutdown')
+async def stop_status_partitions() -> None:
+    await status_partitions.stop()
+
+
+@app.on_event('shutdown')
+async def close_shared_cache() -> None:
+    if shared_cache is not None:
+        await shared_cache.backend.close()
+
 
-app.add_middleware(BannedHostsMiddleware, banned_hosts=settings.banned_hosts)
+# Shutdown handlers run in the order they are added: this one has to come after everything using the engine.
+@app.on_event('shutdown')
+async def dispose_engine() -> None:
+    for bind_engine in [engine, *(replica_set.engines if replica_set else [])]:
+        await bind_engine.dispose()
+    logger.info('Database connections closed.')
 
 
 if __name__ == '__main__':
-    logger.info('Server started.')
-    uvicorn.run('main:app', host=settings.HOST, port=settings.PORT)
\ No newline at end of file
+    from server import serve
+    serve()
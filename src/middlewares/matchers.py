@@ -0,0 +1,131 @@
+import ipaddress
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+from core import settings
+
+
+class _HostNode:
+    __slots__ = ('children', 'exact', 'wildcard')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_HostNode'] = {}
+        self.exact = False
+        self.wildcard = False
+
+
+class HostMatcher:
+    # Patterns are stored in a trie keyed by reversed labels ('a.example.com' -> com, example, a),
+    # so a lookup walks at most as many nodes as the host has labels, whatever the list size.
+
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        self.root = _HostNode()
+        self.match_all = False
+        for pattern in patterns:
+            self.add(pattern)
+
+    @staticmethod
+    def validate(pattern: str) -> None:
+        if '*' in pattern[1:] or (pattern.startswith('*') and pattern != '*' and not pattern.startswith('*.')):
+            raise ValueError(settings.HOST_WILDCARD)
+
+    def add(self, pattern: str) -> None:
+        self.validate(pattern)
+        pattern = pattern.lower().rstrip('.')
+        if pattern == '*':
+            self.match_all = True
+            return
+
+        wildcard = pattern.startswith('*.')
+        node = self.root
+        for label in reversed((pattern[2:] if wildcard else pattern).split('.')):
+            node = node.children.setdefault(label, _HostNode())
+        if wildcard:
+            node.wildcard = True
+        else:
+            node.exact = True
+
+    def match(self, host: str) -> bool:
+        if self.match_all:
+            return True
+        labels = host.lower().rstrip('.').split('.')
+        node = self.root
+        for depth, label in enumerate(reversed(labels), start=1):
+            node = node.children.get(label)
+            if node is None:
+                return False
+            if node.wildcard and depth < len(labels):
+                return True
+        return node.exact
+
+    def match_exact(self, host: str) -> bool:
+        node = self.root
+        for label in reversed(host.lower().rstrip('.').split('.')):
+            node = node.children.get(label)
+            if node is None:
+                return False
+        return node.exact
+
+
+class NetworkMatcher:
+    # Longest-prefix match over CIDR blocks: one hash set of masked network addresses per
+    # prefix length in use, so a lookup is at most 33 (IPv4) or 129 (IPv6) set probes.
+
+    def __init__(self, networks: Iterable[str] = ()) -> None:
+        self._prefixes: Dict[int, Dict[int, Set[int]]] = {4: {}, 6: {}}
+        self._lengths: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:
+        parsed = ipaddress.ip_network(network, strict=False)
+        prefixes = self._prefixes[parsed.version]
+        if parsed.prefixlen not in prefixes:
+            prefixes[parsed.prefixlen] = set()
+            mask = int(parsed.netmask)
+            self._lengths[parsed.version] = sorted(self._lengths[parsed.version] + [(parsed.prefixlen, mask)], reverse=True)
+        prefixes[parsed.prefixlen].add(int(parsed.network_address))
+
+    def match(self, address: str) -> bool:
+        try:
+            parsed = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        if parsed.version == 6 and parsed.ipv4_mapped:
+            parsed = parsed.ipv4_mapped
+
+        value = int(parsed)
+        prefixes = self._prefixes[parsed.version]
+        return any(value & mask in prefixes[length] for length, mask in self._lengths[parsed.version])
+
+    def __len__(self) -> int:
+        return sum(len(networks) for prefixes in self._prefixes.values() for networks in prefixes.values())
+
+
+def is_network(entry: str) -> bool:
+    try:
+        ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        return False
+    return True
+
+
+class Blocklist:
+
+    def __init__(self, entries: Iterable[str] = ()) -> None:
+        self.hosts = HostMatcher()
+        self.networks = NetworkMatcher()
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: str) -> None:
+        if is_network(entry):
+            self.networks.add(entry)
+        else:
+            self.hosts.add(entry)
+
+
+def read_blocklist_file(path: str) -> List[str]:
+    with open(path, encoding='utf-8') as file:
+        entries = [line.split('#', 1)[0].strip() for line in file]
+    return [entry for entry in entries if entry]
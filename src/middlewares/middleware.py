@@ -1,3 +1,7 @@
+import asyncio
+import math
+import os
+import time
 import typing
 
 from starlette.datastructures import URL, Headers
@@ -5,10 +9,16 @@ from starlette.responses import PlainTextResponse, RedirectResponse
 from starlette.types import ASGIApp, Receive, Scope, Send
 
 from core import settings
+from core import metrics
+from core.logger import logger
+from middlewares.matchers import Blocklist, read_blocklist_file
+from middlewares.ratelimit import MemoryRateLimitBackend, RateLimitBackend
 
 
 class BannedHostsMiddleware:
-    def __init__(self, app: ASGIApp, banned_hosts: typing.Optional[typing.Sequence[str]] = None, redirect: bool = True) -> None:
+    def __init__(self, app: ASGIApp, banned_hosts: typing.Optional[typing.Sequence[str]] = None, redirect: bool = True,
+                 banned_networks: typing.Optional[typing.Sequence[str]] = None, blocklist_file: typing.Optional[str] = None,
+                 reload_interval: float = 5.0) -> None:
         if banned_hosts is None:
             banned_hosts = []
 
@@ -18,32 +28,62 @@ class BannedHostsMiddleware:
                 assert pattern.startswith("*."), settings.HOST_WILDCARD
 
         self.app = app
-        self.banned_hosts = list(banned_hosts)
-        self.banned_all = "*" in banned_hosts
+        self.entries = list(banned_hosts) + list(banned_networks or [])
+        self.blocklist = Blocklist(self.entries)
         self.redirect = redirect
 
+        self.blocklist_file = blocklist_file
+        self.reload_interval = reload_interval
+        self._file_mtime: typing.Optional[float] = None
+        self._next_check = 0.0
+        self._reloading = False
+
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
 
-        if self.banned_all:
-            await self.check_host(False, receive, scope, send)
+        if self.blocklist_file:
+            await self.maybe_reload()
 
-        is_correct_host = False
-        gotten_redirect = False
+        blocklist = self.blocklist
         headers = Headers(scope=scope)
         host = headers.get('host', '').split(':')[0]
+        client = scope.get('client')
 
-        for pattern in self.banned_hosts:
-            if host == pattern or (pattern.startswith('*') and host.endswith(pattern[1:])):
-                is_correct_host = True
-                break
-            elif 'www.' + host == pattern:
-                gotten_redirect = True
-
-        if is_correct_host:
-            await self.check_host(gotten_redirect, receive, scope, send)
+        if blocklist.hosts.match(host):
+            await self.check_host(blocklist.hosts.match_exact('www.' + host), receive, scope, send)
+        elif client and blocklist.networks.match(client[0]):
+            await self.check_host(False, receive, scope, send)
         else:
             await self.app(scope, receive, send)
 
+    async def maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check or self._reloading:
+            return
+        self._next_check = now + self.reload_interval
+        self._reloading = True
+        try:
+            mtime = os.stat(self.blocklist_file).st_mtime
+            if mtime != self._file_mtime:
+                self.blocklist = await asyncio.to_thread(self.load_blocklist)
+                self._file_mtime = mtime
+                logger.info('Blocklist reloaded from %s.', self.blocklist_file)
+        except (OSError, ValueError):
+            logger.exception('Failed to reload blocklist from %s.', self.blocklist_file)
+        finally:
+            self._reloading = False
+
+    def load_blocklist(self) -> Blocklist:
+        blocklist = Blocklist(self.entries)
+        for entry in read_blocklist_file(self.blocklist_file):
+            try:
+                blocklist.add(entry)
+            except ValueError:
+                logger.warning('Skipping invalid blocklist entry %r.', entry)
+        return blocklist
+
     async def check_host(self, gotten_redirect, receive, scope, send):
         if gotten_redirect and self.redirect:
             url = URL(scope=scope)
@@ -52,3 +92,69 @@ class BannedHostsMiddleware:
         else:
             response = PlainTextResponse('Invalid host!', status_code=400)
         await response(scope, receive, send)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, rules: typing.Sequence[typing.Tuple[str, str, float, int]] = (),
+                 backend: typing.Optional[RateLimitBackend] = None) -> None:
+        # A rule is (method, path, tokens per second, burst); '*' matches any method. A path ending
+        # in '/' matches everything below it, any other path only matches exactly.
+        self.app = app
+        self.rules = list(rules)
+        for method, path, rate, burst in self.rules:
+            if rate <= 0 or burst < 1:
+                raise ValueError(f'Rate limit for {method} {path} needs a positive rate and a burst of at least 1.')
+        self.backend = backend or MemoryRateLimitBackend()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        index = self.match_rule(scope['method'], scope['path'])
+        if index is None:
+            await self.app(scope, receive, send)
+            return
+
+        _, _, rate, burst = self.rules[index]
+        client = scope.get('client')
+        retry_after = await self.backend.hit((client[0] if client else '', index), rate, burst)
+        if retry_after:
+            response = PlainTextResponse('Too many requests!', status_code=429,
+                                         headers={'Retry-After': str(math.ceil(retry_after))})
+            await response(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    def match_rule(self, method: str, path: str) -> typing.Optional[int]:
+        for index, (rule_method, rule_path, _, _) in enumerate(self.rules):
+            if rule_method in ('*', method) and (path == rule_path or rule_path.endswith('/') and path.startswith(rule_path)):
+                return index
+        return None
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: typing.MutableMapping[str, typing.Any]) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope; its template keeps the label set small.
+            route = getattr(scope.get('route'), 'path_format', '<unmatched>')
+            metrics.http_latency.observe(time.perf_counter() - started, scope['method'], route)
+            metrics.http_requests.inc(scope['method'], route, str(status_code))
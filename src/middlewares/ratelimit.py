@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from typing import Dict, Hashable, Tuple
+
+
+class RateLimitBackend:
+
+    async def hit(self, key: Hashable, rate: float, burst: int) -> float:
+        # Takes one token from the bucket and returns 0, or the seconds until a token is available.
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+
+    def __init__(self, sweep_interval: float = 60.0) -> None:
+        self.sweep_interval = sweep_interval
+        # key -> (tokens, updated_at, full_at); buckets past full_at are idle and get swept.
+        self._buckets: Dict[Hashable, Tuple[float, float, float]] = {}
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def hit(self, key: Hashable, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (burst, now, 0.0))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now, now + (burst - tokens + 1) / rate)
+            return 0.0
+
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return (1 - tokens) / rate
+
+    async def start(self) -> None:
+        # Idle buckets are swept by a background task rather than on the request path.
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def sweep(self, now: float | None = None) -> int:
+        # Expired buckets are deleted in place, the live ones are left where they are.
+        now = time.monotonic() if now is None else now
+        expired = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in expired:
+            del self._buckets[key]
+        return len(expired)
@@ -0,0 +1,52 @@
+"""click counters
+
+Revision ID: 0f1de19808bd
+Revises: 1567ad56e41b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0f1de19808bd'
+down_revision = '1567ad56e41b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('click_counters',
+    sa.Column('url_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('url_id')
+    )
+    op.create_table('click_buckets',
+    sa.Column('url_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('granularity', sa.Enum('hour', 'day', name='bucket_granularity'), nullable=False),
+    sa.Column('bucket_start', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('url_id', 'granularity', 'bucket_start')
+    )
+
+    # Backfill the rollups from the clicks recorded so far.
+    op.execute(
+        'INSERT INTO click_counters (url_id, clicks) '
+        'SELECT url_id, count(*) FROM statuses GROUP BY url_id'
+    )
+    for granularity in ('hour', 'day'):
+        op.execute(
+            'INSERT INTO click_buckets (url_id, granularity, bucket_start, clicks) '
+            f"SELECT url_id, '{granularity}', date_trunc('{granularity}', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', count(*) "
+            'FROM statuses WHERE created_at IS NOT NULL GROUP BY 1, 3'
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('click_buckets')
+    op.drop_table('click_counters')
+    sa.Enum(name='bucket_granularity').drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,29 @@
+"""url short ids
+
+Revision ID: 2b68b17c3351
+Revises: f4a2c3b56d3a
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '2b68b17c3351'
+down_revision = 'f4a2c3b56d3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('urls_short_id_seq')))
+    op.add_column('urls', sa.Column('short_id', sa.BigInteger(), server_default=sa.text("nextval('urls_short_id_seq')"),
+                                    nullable=False))
+    op.execute("ALTER SEQUENCE urls_short_id_seq OWNED BY urls.short_id")
+    op.create_index('ix_urls_short_id', 'urls', ['short_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_urls_short_id', table_name='urls')
+    op.drop_column('urls', 'short_id')
+    op.execute(sa.schema.DropSequence(sa.Sequence('urls_short_id_seq'), if_exists=True))
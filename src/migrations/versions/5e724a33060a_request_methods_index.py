@@ -0,0 +1,23 @@
+"""request methods index
+
+Revision ID: 5e724a33060a
+Revises: f221d20cd7a3
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e724a33060a'
+down_revision = 'f221d20cd7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_statuses_request_methods_created_at', 'statuses', ['request_methods', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_statuses_request_methods_created_at', table_name='statuses')
@@ -0,0 +1,26 @@
+"""analytics covering index
+
+Revision ID: 79cf5247e8d9
+Revises: f61d85fd16fd
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '79cf5247e8d9'
+down_revision = 'f61d85fd16fd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_statuses_url_id_created_at', table_name='statuses')
+    op.create_index('ix_statuses_url_id_created_at', 'statuses', ['url_id', 'created_at', 'id'],
+                    postgresql_include=['host', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_statuses_url_id_created_at', table_name='statuses')
+    op.create_index('ix_statuses_url_id_created_at', 'statuses', ['url_id', 'created_at', 'id'])
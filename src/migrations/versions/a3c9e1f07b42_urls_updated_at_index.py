@@ -0,0 +1,23 @@
+"""urls updated_at index
+
+Revision ID: a3c9e1f07b42
+Revises: 5e724a33060a
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e1f07b42'
+down_revision = '5e724a33060a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_urls_live_updated_at', 'urls', ['updated_at'], postgresql_where=sa.text('is_delete = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_urls_live_updated_at', table_name='urls')
@@ -0,0 +1,35 @@
+"""hot query indexes
+
+Revision ID: f4a2c3b56d3a
+Revises: 0f1de19808bd
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f4a2c3b56d3a'
+down_revision = '0f1de19808bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_statuses_created_at_id', 'statuses', ['created_at', 'id'])
+    op.create_index('ix_statuses_url_id_created_at', 'statuses', ['url_id', 'created_at', 'id'])
+    op.create_index('ix_statuses_user_id_created_at', 'statuses', ['user_id', 'created_at', 'id'])
+    op.create_index('ix_statuses_host_created_at', 'statuses', ['host', 'created_at', 'id'])
+    op.create_index('ix_urls_live_id', 'urls', ['id'], postgresql_include=['url'],
+                    postgresql_where=sa.text('is_delete = false'))
+    op.create_index('ix_urls_live_created_at', 'urls', ['created_at', 'id'],
+                    postgresql_where=sa.text('is_delete = false'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_urls_live_created_at', table_name='urls')
+    op.drop_index('ix_urls_live_id', table_name='urls')
+    op.drop_index('ix_statuses_host_created_at', table_name='statuses')
+    op.drop_index('ix_statuses_user_id_created_at', table_name='statuses')
+    op.drop_index('ix_statuses_url_id_created_at', table_name='statuses')
+    op.drop_index('ix_statuses_created_at_id', table_name='statuses')
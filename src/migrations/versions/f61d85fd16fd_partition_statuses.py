@@ -0,0 +1,110 @@
+"""partition statuses
+
+Revision ID: f61d85fd16fd
+Revises: 2b68b17c3351
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+import os
+
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f61d85fd16fd'
+down_revision = '2b68b17c3351'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_statuses_created_at_id', ['created_at', 'id']),
+    ('ix_statuses_url_id_created_at', ['url_id', 'created_at', 'id']),
+    ('ix_statuses_user_id_created_at', ['user_id', 'created_at', 'id']),
+    ('ix_statuses_host_created_at', ['host', 'created_at', 'id']),
+)
+# The same environment variables the app reads, so these partitions match the ones it maintains.
+INTERVAL = os.getenv('STATUS_PARTITION_INTERVAL', 'month')
+AHEAD = int(os.getenv('STATUS_PARTITIONS_AHEAD', '2'))
+COLUMNS = 'id, created_at, created_by, updated_at, updated_by, host, request_methods, url_id, user_id'
+
+
+def create_statuses(partitioned: bool) -> None:
+    # Partitioned by created_at, which then has to be part of the primary key and can't be null.
+    op.create_table('statuses',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=not partitioned),
+    sa.Column('created_by', sa.String(length=255), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('updated_by', sa.String(length=255), nullable=True),
+    sa.Column('host', sa.String(length=255), nullable=False),
+    sa.Column('request_methods', postgresql.ENUM('GET', 'POST', 'PATCH', 'DELETE', name='request_methods', create_type=False), nullable=True),
+    sa.Column('url_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint(*(('id', 'created_at') if partitioned else ('id',)), name='statuses_pkey'),
+    **({'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {})
+    )
+
+
+def move_aside(name: str) -> None:
+    for index, _ in INDEXES:
+        op.drop_index(index, table_name='statuses')
+    op.rename_table('statuses', name)
+    op.execute(f'ALTER TABLE {name} RENAME CONSTRAINT statuses_pkey TO {name}_pkey')
+
+
+def create_indexes() -> None:
+    for index, columns in INDEXES:
+        op.create_index(index, 'statuses', columns)
+
+
+def dated_partitions(first: datetime | None) -> list:
+    # Same ranges and names as db/partitions.py, from the oldest row up to the partitions kept ahead.
+    interval = INTERVAL
+
+    def floor(moment: datetime) -> datetime:
+        moment = moment.astimezone(timezone.utc)
+        return datetime(moment.year, moment.month, moment.day if interval == 'day' else 1, tzinfo=timezone.utc)
+
+    def following(start: datetime) -> datetime:
+        return start + timedelta(days=1) if interval == 'day' else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    now = datetime.now(timezone.utc)
+    last = floor(now)
+    for _ in range(AHEAD):
+        last = following(last)
+
+    partitions = []
+    start = floor(min(first or now, now))
+    while start <= last:
+        name = f'statuses_p{start:%Y_%m_%d}' if interval == 'day' else f'statuses_p{start:%Y_%m}'
+        partitions.append((name, start, following(start)))
+        start = following(start)
+    return partitions
+
+
+def upgrade() -> None:
+    move_aside('statuses_unpartitioned')
+    create_statuses(partitioned=True)
+    op.execute('CREATE TABLE statuses_default PARTITION OF statuses DEFAULT')
+
+    first = op.get_bind().execute(sa.text('SELECT min(created_at) FROM statuses_unpartitioned')).scalar()
+    for name, start, end in dated_partitions(first):
+        op.execute(f"CREATE TABLE {name} PARTITION OF statuses FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+
+    op.execute(f'INSERT INTO statuses ({COLUMNS}) '
+               f"SELECT {COLUMNS.replace('created_at', 'coalesce(created_at, CURRENT_TIMESTAMP)')} FROM statuses_unpartitioned")
+    op.drop_table('statuses_unpartitioned')
+    create_indexes()
+
+
+def downgrade() -> None:
+    move_aside('statuses_partitioned')
+    create_statuses(partitioned=False)
+    op.execute(f'INSERT INTO statuses ({COLUMNS}) SELECT {COLUMNS} FROM statuses_partitioned')
+    op.drop_table('statuses_partitioned')
+    create_indexes()
@@ -1,12 +1,16 @@
 import uuid
 
-from sqlalchemy import TIMESTAMP, VARCHAR, Boolean, Column, Enum, ForeignKey, String, func, sql
+from sqlalchemy import DDL, TIMESTAMP, VARCHAR, BigInteger, Boolean, Column, Enum, ForeignKey, Index, LargeBinary, Sequence, String, event, func, sql, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
+from core.shortcodes import encode_short_id
+
 
 Base = declarative_base()
 
+short_id_seq = Sequence('urls_short_id_seq')
+
 
 class BaseModel(Base):
     __abstract__ = True
@@ -21,20 +25,80 @@ class BaseModel(Base):
 class StatusModel(BaseModel):
     __tablename__ = 'statuses'
 
+    # Range partitioned by created_at (see db/partitions.py), so the partition key is part of the primary key.
+    created_at = Column(TIMESTAMP(timezone=True), server_default=sql.func.current_timestamp(), primary_key=True)
     host = Column(String(255), nullable=False)
     request_methods = Column(Enum('GET', 'POST', 'PATCH', 'DELETE', name='request_methods'))
     url_id = Column(UUID(as_uuid=True), ForeignKey('urls.id', ondelete='RESTRICT'), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='RESTRICT'), nullable=True)
 
+    __table_args__ = (
+        Index('ix_statuses_created_at_id', 'created_at', 'id'),
+        # host and user_id are included so per-url analytics are answered by index-only scans.
+        Index('ix_statuses_url_id_created_at', 'url_id', 'created_at', 'id', postgresql_include=['host', 'user_id']),
+        Index('ix_statuses_user_id_created_at', 'user_id', 'created_at', 'id'),
+        Index('ix_statuses_host_created_at', 'host', 'created_at', 'id'),
+        # Few distinct methods, but the rare ones (POST, PATCH, DELETE) would otherwise scan every click.
+        Index('ix_statuses_request_methods_created_at', 'request_methods', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+# Rows outside of every dated partition land here instead of failing the insert.
+event.listen(StatusModel.__table__, 'after_create',
+             DDL('CREATE TABLE IF NOT EXISTS statuses_default PARTITION OF statuses DEFAULT').execute_if(dialect='postgresql'))
+
 
 class UrlModel(BaseModel):
     __tablename__ = 'urls'
 
     url = Column(String(255), nullable=False, unique=True)
     is_delete = Column(Boolean, nullable=False, default=False)
+    short_id = Column(BigInteger, short_id_seq, server_default=short_id_seq.next_value(), nullable=False, unique=True, index=True)
+
+    __table_args__ = (
+        Index('ix_urls_live_id', 'id', postgresql_include=['url'], postgresql_where=text('is_delete = false')),
+        Index('ix_urls_live_created_at', 'created_at', 'id', postgresql_where=text('is_delete = false')),
+        # Revived urls keep their created_at, the url filter finds them by updated_at.
+        Index('ix_urls_live_updated_at', 'updated_at', postgresql_where=text('is_delete = false')),
+    )
+
+    @property
+    def short_code(self) -> str | None:
+        return encode_short_id(self.short_id) if self.short_id else None
 
 
 class UserModel(BaseModel):
     __tablename__ = 'users'
 
     name = Column(VARCHAR(255), nullable=False)
+
+
+class ClickCounterModel(Base):
+    __tablename__ = 'click_counters'
+
+    url_id = Column(UUID(as_uuid=True), ForeignKey('urls.id', ondelete='CASCADE'), primary_key=True)
+    clicks = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=sql.func.current_timestamp(), onupdate=func.current_timestamp())
+
+
+class ClickBucketModel(Base):
+    __tablename__ = 'click_buckets'
+
+    url_id = Column(UUID(as_uuid=True), ForeignKey('urls.id', ondelete='CASCADE'), primary_key=True)
+    granularity = Column(Enum('hour', 'day', name='bucket_granularity'), primary_key=True)
+    bucket_start = Column(TIMESTAMP(timezone=True), primary_key=True)
+    clicks = Column(BigInteger, nullable=False, server_default='0')
+
+
+class UrlSketchModel(Base):
+    __tablename__ = 'url_sketches'
+
+    # Compressed HyperLogLog registers (core/hyperloglog.py) of the distinct users or hosts per url,
+    # for all time and per bucket. All-time sketches use the epoch as bucket_start.
+    # Enum values are declared in alphabetical order so rows sort the same way in Python and Postgres.
+    url_id = Column(UUID(as_uuid=True), ForeignKey('urls.id', ondelete='CASCADE'), primary_key=True)
+    kind = Column(Enum('hosts', 'users', name='sketch_kind'), primary_key=True)
+    granularity = Column(Enum('day', 'hour', 'total', name='sketch_granularity'), primary_key=True)
+    bucket_start = Column(TIMESTAMP(timezone=True), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
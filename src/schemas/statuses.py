@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import List
+
 from pydantic import BaseModel
 from pydantic.json import UUID
 
@@ -20,4 +23,41 @@ class StatusReadSchema(StatusSchema, BaseReadSchema):
 
 
 class StatusUpdateSchema(StatusSchema, BaseUpdateSchema):
-    pass
\ No newline at end of file
+    pass
+
+
+class ClickBucketSchema(BaseModel):
+    bucket_start: datetime
+    clicks: int
+
+    class Config:
+        orm_mode = True
+
+
+class ClickSummarySchema(BaseModel):
+    url_id: UUID
+    clicks: int
+    granularity: str | None
+    unique_users: int
+    unique_hosts: int
+    buckets: List[ClickBucketSchema] = []
+
+
+class HostClicksSchema(BaseModel):
+    host: str
+    clicks: int
+
+
+class ClickAnalyticsSchema(BaseModel):
+    url_id: UUID
+    # The range every aggregate covers, the requested one widened to whole hours (or days).
+    since: datetime
+    until: datetime
+    granularity: str
+    clicks: int
+    unique_users: int
+    unique_hosts: int
+    # Relative standard error of the unique counts, which are HyperLogLog estimates.
+    unique_error: float
+    buckets: List[ClickBucketSchema] = []
+    top_hosts: List[HostClicksSchema] = []
@@ -13,6 +13,7 @@ class UrlCreateSchema(UrlSchema, BaseCreateSchema):
 
 class UrlReadSchema(UrlSchema, BaseReadSchema):
     is_delete: bool
+    short_code: str | None
 
 
 class UrlUpdateSchema(UrlSchema, BaseUpdateSchema):
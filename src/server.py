@@ -0,0 +1,45 @@
+import importlib.util
+import os
+
+import uvicorn
+
+from core.logger import logger
+from core.settings import settings
+
+
+# The fast implementation of each and the pure Python one it falls back to.
+IMPLEMENTATIONS = {'loop': ('uvloop', 'asyncio'), 'http': ('httptools', 'h11')}
+
+
+def implementation(kind: str, choice: str) -> str:
+    # 'auto' lets uvicorn take the fast one when it is installed. An explicit choice that is not
+    # installed falls back instead of failing every worker at startup.
+    fast, fallback = IMPLEMENTATIONS[kind]
+    if choice == fast and importlib.util.find_spec(fast) is None:
+        logger.warning('%s is not installed, using %s.', fast, fallback)
+        return fallback
+    return choice
+
+
+def worker_count(workers: int, storage_backend: str) -> int:
+    # Memory storage lives in the process, separate workers would each see their own data.
+    if storage_backend == 'memory':
+        if workers > 1:
+            logger.warning('Memory storage runs a single worker.')
+        return 1
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def serve() -> None:
+    # Every worker is a separate process importing main:app, with its own connection pool (DB_POOL_SIZE),
+    # caches and click ingestor, started and drained by the app's startup and shutdown handlers.
+    workers = worker_count(settings.WORKERS, settings.STORAGE_BACKEND)
+    logger.info('Server started with %s workers.', workers)
+    uvicorn.run('main:app', host=settings.HOST, port=settings.PORT, workers=workers,
+                loop=implementation('loop', settings.SERVER_LOOP), http=implementation('http', settings.SERVER_HTTP),
+                backlog=settings.SERVER_BACKLOG, timeout_keep_alive=settings.SERVER_KEEP_ALIVE,
+                access_log=settings.SERVER_ACCESS_LOG)
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.settings import settings
+from db.database import storage
+from db.storage import StorageBackend
+from services.counters import GRANULARITIES, SKETCH_KINDS, CounterServiceDB, as_utc, truncate
+
+
+BUCKET_SIZES = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+
+def align(moment: datetime, granularity: str, up: bool = False) -> datetime:
+    # Start of the bucket holding moment, or with up the first bucket start at or after it.
+    start = truncate(moment, granularity)
+    return start + BUCKET_SIZES[granularity] if up and start < moment else start
+
+
+class AnalyticsServiceDB:
+
+    def __init__(self, storage: StorageBackend) -> None:
+        self._storage = storage
+        self._counters = CounterServiceDB(storage)
+
+    def time_range(self, since: datetime | None, until: datetime | None, granularity: str) -> Tuple[datetime, datetime]:
+        until = as_utc(until) if until else datetime.now(timezone.utc)
+        since = as_utc(since) if since else until - timedelta(seconds=settings.ANALYTICS_DEFAULT_RANGE)
+        if since >= until:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='since must be earlier than until.')
+        if (until - since) / BUCKET_SIZES[granularity] > settings.ANALYTICS_MAX_BUCKETS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='Too many buckets, narrow the range or use a coarser granularity.')
+        return since, until
+
+    async def get_analytics(self, db: AsyncSession, url_id: UUID, *, granularity: str = 'hour', since: datetime | None = None,
+                            until: datetime | None = None, top: int = 10) -> dict:
+        since, until = self.time_range(since, until, granularity)
+
+        # Rollups and sketches only cover whole hourly (or daily) buckets, so the range is widened to
+        # whole sketch buckets and every aggregate is computed over it. The widened range is returned.
+        sketch_granularity = 'day' if granularity == 'day' else 'hour'
+        since, until = align(since, sketch_granularity), align(until, sketch_granularity, up=True)
+
+        # Hourly and daily buckets are read from the click rollups, minute buckets and hosts are
+        # aggregated from the statuses.
+        if granularity in GRANULARITIES:
+            rollups = await self._storage.get_buckets(db, url_id, granularity, since=since, until=until)
+            buckets = [(bucket.bucket_start, bucket.clicks) for bucket in rollups]
+        else:
+            buckets = await self._storage.count_by_bucket(db, url_id, granularity, since, until)
+        hosts = await self._storage.top_hosts(db, url_id, since, until, top)
+
+        # Distinct users and hosts are estimated by merging the sketches over the range.
+        uniques = {kind: await self._counters.get_uniques(db, url_id, kind, sketch_granularity, since=since, until=until)
+                   for kind in SKETCH_KINDS}
+
+        return {
+            'url_id': url_id,
+            'since': since,
+            'until': until,
+            'granularity': granularity,
+            'clicks': sum(clicks for _, clicks in buckets),
+            'unique_users': uniques['users'].count(),
+            'unique_hosts': uniques['hosts'].count(),
+            'unique_error': uniques['users'].error,
+            'buckets': [{'bucket_start': bucket_start, 'clicks': clicks} for bucket_start, clicks in buckets],
+            'top_hosts': [{'host': host, 'clicks': clicks} for host, clicks in hosts],
+        }
+
+
+analytics_service_db = AnalyticsServiceDB(storage)
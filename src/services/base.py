@@ -1,12 +1,18 @@
-from typing import Generic, List, Optional, Type, TypeVar
+import functools
+
+from typing import Any, Generic, List, Optional, Sequence, Type, TypeVar
 from uuid import UUID
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import select, update
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from db.storage import StorageBackend
 from models.models import Base
+from services.cache import LRUCache
+from services.shared_cache import SharedCache
+from services.singleflight import single_flight
 
 
 ModelType = TypeVar('ModelType', bound=Base)
@@ -33,62 +39,92 @@ class BaseService:
 
 
 class BaseServiceDB(BaseService):
+    # Unique columns used as the ON CONFLICT target of bulk inserts.
+    conflict_columns: Sequence[str] = ()
 
-    def __init__(self, model: Type[ModelType]):
+    def __init__(self, model: Type[ModelType], storage: StorageBackend, caches: Sequence[LRUCache] = (),
+                 shared_cache: SharedCache | None = None):
         self._model = model
+        self._storage = storage
+        self._caches = tuple(caches)
+        self._shared_cache = shared_cache
+
+    def _cache_keys(self, id: UUID, obj: Any) -> List[Any]:
+        return [id]
+
+    def _shared_keys(self, id: UUID, obj: Any) -> List[str]:
+        return []
+
+    async def _invalidate(self, id: UUID, obj: Any) -> None:
+        # Local caches of other workers keep their entries until these expire, which behind a shared cache
+        # is within SHARED_CACHE_LOCAL_TTL.
+        for key in self._cache_keys(id, obj):
+            for cache in self._caches:
+                cache.invalidate(key)
+        if self._shared_cache is not None and (keys := self._shared_keys(id, obj)):
+            await self._shared_cache.invalidate(*keys)
 
 
 class CreateServiceMixin(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
     async def create_object(self, db: AsyncSession, *, obj: CreateSchemaType) -> ModelType:
+        # Same as a batch of one: an existing row is returned, revived if it was deleted.
         encoded_obj = jsonable_encoder(obj)
-        db_data = self._model(**encoded_obj)
-        db.add(db_data)
+        if self.conflict_columns:
+            [db_data] = await self._storage.insert_many(db, self._model, [encoded_obj], self.conflict_columns)
+        else:
+            db_data = await self._storage.insert(db, self._model, encoded_obj)
 
-        await db.commit()
-        await db.refresh(db_data)
+        await self._storage.commit(db)
+        await self._invalidate(db_data.id, db_data)
         return db_data
 
-    async def create_objects(self, db: AsyncSession, *, obj: CreateSchemaType) -> List[ModelType]:
+    async def create_objects(self, db: AsyncSession, *, obj: Sequence[CreateSchemaType]) -> List[ModelType]:
         encoded_objs = jsonable_encoder(obj)
-        data = [self._model(**db_data) for db_data in encoded_objs]
-        db.add_all(data)
+        data = await self._storage.insert_many(db, self._model, encoded_objs, self.conflict_columns)
 
-        await db.commit()
-        for obj in data:
-            await db.refresh(obj)
+        await self._storage.commit(db)
+        for db_data in data:
+            await self._invalidate(db_data.id, db_data)
         return data
 
 
 class ReadServiceMixin(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
     async def get_object(self, db: AsyncSession, id: UUID) -> Optional[ModelType]:
-        statement = select(self._model).where(self._model.id == id).where(self._model.is_delete == False)
-        obj = await db.execute(statement=statement)
-        return obj.scalar_one_or_none()
+        # Concurrent reads of a row from the same database share one query. They share its column values,
+        # every caller gets its own instance, outside of any session.
+        values = await single_flight.do((self._model.__tablename__, self._storage.target(db), id),
+                                        functools.partial(self._get_values, db, id))
+        return self._model(**values) if values is not None else None
 
-    async def get_objects(self, db: AsyncSession, *, skip=0, limit=100) -> List[ModelType]:
-        statement = select(self._model).where(self._model.is_delete == False).offset(skip).limit(limit)
-        obj = await db.execute(statement=statement)
-        return obj.scalars().all()
+    async def _get_values(self, db: AsyncSession, id: UUID) -> dict | None:
+        if (obj := await self._storage.get(db, self._model, id)) is None:
+            return None
+        return {attribute.key: getattr(obj, attribute.key) for attribute in inspect(self._model).column_attrs}
+
+    async def get_objects(self, db: AsyncSession, *, skip=0, limit=100, cursor: str | None = None) -> List[ModelType]:
+        return await self._storage.list(db, self._model, skip=skip, limit=limit, cursor=cursor)
 
 
 class UpdateServiceMixin(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
     async def update_object(self, db: AsyncSession, *, id: UUID, obj: UpdateSchemaType) -> ModelType:
-        statement = update(self._model).where(self._model.id == id).where(self._model.is_delete == False)
-        statement = statement.values(obj.__dict__).returning(self._model)
-        obj = await db.execute(statement=statement)
-        return obj.one_or_none()
+        obj = await self._storage.update(db, self._model, id, obj.__dict__)
+
+        await self._storage.commit(db)
+        await self._invalidate(id, obj)
+        return obj
 
 
 class DeleteServiceMixin(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
     async def delete_object(self, db: AsyncSession, *, id: UUID) -> ModelType:
-        statement = update(self._model).where(self._model.id == id).where(self._model.is_delete == False)
-        statement = statement.values({'is_delete': True}).returning(self._model)
-        obj = await db.execute(statement=statement)
-        return obj.one_or_none()
+        obj = await self._storage.update(db, self._model, id, {'is_delete': True})
+
+        await self._storage.commit(db)
+        await self._invalidate(id, obj)
+        return obj
 
 
 class ServiceDB(ReadServiceMixin, CreateServiceMixin, UpdateServiceMixin, DeleteServiceMixin, BaseServiceDB,
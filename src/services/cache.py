@@ -0,0 +1,80 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+from core.settings import settings
+
+
+# Returned on a miss, so that a cached ``None`` (negative entry) can be told apart.
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+def create_redirect_cache() -> LRUCache:
+    ttl, negative_ttl = settings.REDIRECT_CACHE_TTL, settings.REDIRECT_CACHE_NEGATIVE_TTL
+    if settings.SHARED_CACHE_BACKEND:
+        # Invalidations only reach the entries of the worker making the change. Behind a shared cache the
+        # local entries are kept short, so other workers stop serving a changed link within seconds.
+        ttl = min(ttl, settings.SHARED_CACHE_LOCAL_TTL)
+        negative_ttl = min(negative_ttl, settings.SHARED_CACHE_LOCAL_TTL)
+    return LRUCache(maxsize=settings.REDIRECT_CACHE_SIZE, ttl=ttl, negative_ttl=negative_ttl)
+
+
+redirect_cache = create_redirect_cache()
+# Keys of the urls this worker changed within DB_REPLICA_WRITE_WINDOW, whose reads skip the replicas.
+recent_writes = LRUCache(maxsize=settings.REDIRECT_CACHE_SIZE, ttl=settings.DB_REPLICA_WRITE_WINDOW,
+                         negative_ttl=settings.DB_REPLICA_WRITE_WINDOW)
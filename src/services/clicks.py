@@ -0,0 +1,170 @@
+import asyncio
+import uuid
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Sequence
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import logger
+from core.settings import settings
+from db.database import storage
+from db.storage import StorageBackend
+from services.counters import count_clicks, sketch_clicks
+
+
+_STOP = object()
+
+
+@dataclass
+class ClickEvent:
+    url_id: UUID
+    user_id: UUID | None
+    host: str
+    request_methods: str
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def as_row(self) -> dict:
+        return {
+            'id': uuid.uuid4(),
+            'url_id': self.url_id,
+            'user_id': self.user_id,
+            'host': self.host,
+            'request_methods': self.request_methods,
+            'created_at': self.created_at,
+        }
+
+
+async def write_clicks(storage: StorageBackend, db: AsyncSession, events: Sequence[ClickEvent]) -> None:
+    await storage.add_statuses(db, [event.as_row() for event in events])
+    await storage.add_counts(db, *count_clicks(events))
+    await storage.add_sketches(db, sketch_clicks(events))
+
+
+class ClickIngestor:
+
+    def __init__(self, storage: StorageBackend, *, maxsize: int, batch_size: int, flush_interval: float,
+                 put_timeout: float, flush_retries: int = 3, retry_backoff: float = 0.1) -> None:
+        self._storage = storage
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.flush_retries = flush_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._accepting = False
+
+        self.enqueued = 0
+        self.overflowed = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run())
+        self._accepting = True
+        logger.info('Click ingestor started.')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._accepting = False
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info('Click ingestor stopped, %s clicks flushed, %s dropped.', self.flushed, self.dropped)
+
+    async def submit(self, event: ClickEvent) -> bool:
+        # False means the pipeline is not running and the caller has to write the click itself.
+        if not self._accepting:
+            return False
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed += 1
+            try:
+                await asyncio.wait_for(self._queue.put(event), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return True
+
+        self.enqueued += 1
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: Sequence[ClickEvent]) -> None:
+        # A batch is written in a single transaction, so a failed attempt leaves nothing behind and is
+        # retried, waiting retry_backoff seconds and doubling that on each attempt. Clicks of a batch still
+        # failing after flush_retries retries are lost.
+        for attempt in range(self.flush_retries + 1):
+            try:
+                async with self._storage.session() as session:
+                    await write_clicks(self._storage, session, batch)
+                    await self._storage.commit(session)
+            except Exception:
+                if attempt == self.flush_retries:
+                    self.failed += len(batch)
+                    logger.exception('Failed to flush a batch after %s attempts, %s clicks lost.', attempt + 1,
+                                     len(batch))
+                    return
+                logger.warning('Failed to flush %s clicks, retrying.', len(batch), exc_info=True)
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            else:
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'enqueued': self.enqueued,
+            'overflowed': self.overflowed,
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+
+click_ingestor = ClickIngestor(storage, maxsize=settings.CLICK_QUEUE_SIZE, batch_size=settings.CLICK_BATCH_SIZE,
+                               flush_interval=settings.CLICK_FLUSH_INTERVAL, put_timeout=settings.CLICK_PUT_TIMEOUT,
+                               flush_retries=settings.CLICK_FLUSH_RETRIES, retry_backoff=settings.CLICK_RETRY_BACKOFF)
@@ -0,0 +1,132 @@
+import functools
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Protocol, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import storage
+from core.hyperloglog import HyperLogLog
+from db.storage import Buckets, Sketches, StorageBackend, Totals
+from models.models import ClickBucketModel
+from services.singleflight import single_flight
+
+
+GRANULARITIES = ('hour', 'day')
+SKETCH_KINDS = ('users', 'hosts')
+# bucket_start of the all-time sketches.
+ALL_TIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Click(Protocol):
+    url_id: UUID
+    user_id: UUID | None
+    host: str
+    created_at: datetime
+
+
+def as_utc(moment: datetime | None) -> datetime | None:
+    # Query parameters without an offset are taken as UTC, like the buckets.
+    return moment.replace(tzinfo=timezone.utc) if moment is not None and moment.tzinfo is None else moment
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    # Buckets start on UTC hours and days; naive moments are taken as UTC.
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def count_clicks(clicks: Iterable[Click]) -> Tuple[Totals, Buckets]:
+    totals: Counter = Counter()
+    buckets: Counter = Counter()
+    for click in clicks:
+        totals[click.url_id] += 1
+        for granularity in GRANULARITIES:
+            buckets[(click.url_id, granularity, truncate(click.created_at, granularity))] += 1
+    return totals, buckets
+
+
+def sketch_clicks(clicks: Iterable[Click]) -> Sketches:
+    # Anonymous clicks count towards the distinct hosts only.
+    sketches: defaultdict = defaultdict(HyperLogLog)
+    for click in clicks:
+        for kind, value in (('users', click.user_id), ('hosts', click.host)):
+            if value is None:
+                continue
+            sketches[(click.url_id, kind, 'total', ALL_TIME)].add(value)
+            for granularity in GRANULARITIES:
+                sketches[(click.url_id, kind, granularity, truncate(click.created_at, granularity))].add(value)
+    return sketches
+
+
+class CounterServiceDB:
+
+    def __init__(self, storage: StorageBackend) -> None:
+        self._storage = storage
+
+    async def increment(self, db: AsyncSession, clicks: Iterable[Click]) -> None:
+        clicks = list(clicks)
+        await self._storage.add_counts(db, *count_clicks(clicks))
+        await self._storage.add_sketches(db, sketch_clicks(clicks))
+
+    async def get_count(self, db: AsyncSession, url_id: UUID) -> int:
+        return await self._storage.get_count(db, url_id)
+
+    async def get_buckets(self, db: AsyncSession, url_id: UUID, granularity: str, *, since: datetime | None = None,
+                          until: datetime | None = None) -> List[ClickBucketModel]:
+        if since:
+            since = truncate(since, granularity)
+        return await self._storage.get_buckets(db, url_id, granularity, since=since, until=until)
+
+    async def get_uniques(self, db: AsyncSession, url_id: UUID, kind: str, granularity: str = 'total', *,
+                          since: datetime | None = None, until: datetime | None = None) -> HyperLogLog:
+        # Bucket sketches are merged, so a range counts whole buckets from the one holding since.
+        if since and granularity in GRANULARITIES:
+            since = truncate(since, granularity)
+        if granularity == 'hour' and since and until:
+            # Whole days in the range are read from the daily sketches, which hold the same values as
+            # their hours, so a long range merges a few dozen hourly sketches instead of thousands.
+            first_day = truncate(since, 'day')
+            first_day += timedelta(days=1) if first_day < since else timedelta()
+            last_day = truncate(until, 'day')
+            if first_day < last_day:
+                ranges = [('hour', since, first_day), ('day', first_day, last_day), ('hour', last_day, until)]
+                sketches = []
+                for part, start, end in ranges:
+                    sketches += await self._storage.get_sketches(db, url_id, kind, part, since=start, until=end)
+                return HyperLogLog.union(sketches)
+        return HyperLogLog.union(await self._storage.get_sketches(db, url_id, kind, granularity, since=since, until=until))
+
+    async def get_summary(self, db: AsyncSession, url_id: UUID, granularity: str | None = None, *,
+                          since: datetime | None = None, until: datetime | None = None) -> dict:
+        since, until = as_utc(since), as_utc(until)
+        return await single_flight.do(('summary', self._storage.target(db), url_id, granularity, since, until),
+                                      functools.partial(self._get_summary, db, url_id, granularity, since=since, until=until))
+
+    async def _get_summary(self, db: AsyncSession, url_id: UUID, granularity: str | None, *,
+                           since: datetime | None, until: datetime | None) -> dict:
+        clicks = await self.get_count(db, url_id)
+        buckets = []
+        if granularity:
+            # Plain data, as the summary is shared with concurrent callers outside this session.
+            buckets = [{'bucket_start': bucket.bucket_start, 'clicks': bucket.clicks}
+                       for bucket in await self.get_buckets(db, url_id, granularity, since=since, until=until)]
+        # With a range every count covers the buckets in it, otherwise they are all-time totals.
+        if granularity and (since or until):
+            clicks = sum(bucket['clicks'] for bucket in buckets)
+            users = await self.get_uniques(db, url_id, 'users', granularity, since=since, until=until)
+            hosts = await self.get_uniques(db, url_id, 'hosts', granularity, since=since, until=until)
+        else:
+            users = await self.get_uniques(db, url_id, 'users')
+            hosts = await self.get_uniques(db, url_id, 'hosts')
+        return {'url_id': url_id, 'clicks': clicks, 'granularity': granularity, 'unique_users': users.count(),
+                'unique_hosts': hosts.count(), 'buckets': buckets}
+
+
+counter_service_db = CounterServiceDB(storage)
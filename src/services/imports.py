@@ -0,0 +1,81 @@
+from typing import Any, AsyncIterator, List, Tuple
+
+import orjson
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import logger
+from core.settings import settings
+from db.database import storage
+from schemas.urls import UrlCreateSchema
+from services.urls import url_service_db
+
+
+async def read_lines(chunks: AsyncIterator[bytes], max_line_size: int) -> AsyncIterator[bytes | None]:
+    # Yields complete lines without the trailing newline, or None for a line longer than max_line_size.
+    buffer = b''
+    skipping = False
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line if len(line) <= max_line_size else None
+        if len(buffer) > max_line_size:
+            if not skipping:
+                yield None
+            skipping = True
+            buffer = b''
+    if buffer and not skipping:
+        yield buffer
+
+
+class UrlImportService:
+
+    async def import_ndjson(self, db: AsyncSession, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        pending: List[Tuple[int, Any]] = []
+        number = 0
+        async for line in read_lines(chunks, settings.IMPORT_MAX_LINE_SIZE):
+            number += 1
+            if line is not None and not line.strip():
+                continue
+            pending.append((number, self.parse(line)))
+            if len(pending) >= settings.BULK_INSERT_CHUNK_SIZE:
+                yield await self.flush(db, pending)
+                pending = []
+        if pending:
+            yield await self.flush(db, pending)
+
+    def parse(self, line: bytes | None) -> UrlCreateSchema | str:
+        if line is None:
+            return 'Line is too long.'
+        try:
+            return UrlCreateSchema.parse_raw(line)
+        except ValidationError as error:
+            return str(error.errors()[0]['msg'])
+
+    async def flush(self, db: AsyncSession, pending: List[Tuple[int, Any]]) -> bytes:
+        valid = [item for _, item in pending if isinstance(item, UrlCreateSchema)]
+        try:
+            created = await url_service_db.create_objects(db=db, obj=valid)
+        except SQLAlchemyError:
+            logger.exception('Failed to import %s urls.', len(valid))
+            await storage.rollback(db)
+            created = []
+            pending = [(number, item if isinstance(item, str) else 'Not stored.') for number, item in pending]
+
+        created = iter(created)
+        results = []
+        for number, item in pending:
+            if isinstance(item, str):
+                results.append({'line': number, 'error': item})
+            else:
+                url = next(created)
+                results.append({'line': number, 'id': url.id, 'short_code': url.short_code, 'url': url.url})
+        return b''.join(orjson.dumps(result) + b'\n' for result in results)
+
+
+url_import_service = UrlImportService()
@@ -0,0 +1,13 @@
+from typing import Any, Sequence
+
+from db.pagination import encode_cursor
+
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def next_cursor(items: Sequence[Any], limit: int) -> str | None:
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
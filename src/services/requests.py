@@ -1,33 +1,145 @@
+import functools
+
+from typing import AsyncContextManager, Awaitable, Callable, Tuple
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.models import StatusModel, UrlModel
+from core.shortcodes import decode_short_code
+from db.database import storage
+from db.storage import StorageBackend
+from models.models import UrlModel
+from services.cache import MISSING, recent_writes, redirect_cache
+from services.clicks import ClickEvent, click_ingestor, write_clicks
+from services.shared_cache import SharedCache, redirect_key, shared_cache
+from services.singleflight import single_flight
+from services.url_filter import UrlFilter, url_filter
 
 
 class RequestServiceDB:
 
-    async def is_delete(self, statement):
-        return statement.filter(UrlModel.is_delete == False)
+    def __init__(self, storage: StorageBackend, shared_cache: SharedCache | None = None,
+                 url_filter: UrlFilter | None = None) -> None:
+        self._storage = storage
+        self._shared_cache = shared_cache
+        self._url_filter = url_filter
 
     async def put_status(self, user_id, url_id, db, request_methods, host):
-        obj = StatusModel(url_id=url_id, user_id=user_id, host=host, request_methods=request_methods)
-        db.add(obj)
-        await db.commit()
+        event = ClickEvent(url_id=url_id, user_id=user_id, host=host, request_methods=request_methods)
+        await write_clicks(self._storage, db, [event])
+        await self._storage.commit(db)
+
+    def parse_key(self, key: UUID | str) -> UUID | str:
+        if isinstance(key, UUID):
+            return key
+        try:
+            return UUID(key)
+        except ValueError:
+            return key
 
     async def get_url_by_id(self, db, url_id):
-        statement = select(UrlModel).filter(UrlModel.id == url_id)
-        statement = await self.is_delete(statement)
-        obj = await db.execute(statement=statement)
-        return obj.scalar_one_or_none()
-
-    async def request(self, url_id: UUID, user_id: UUID | None, db: AsyncSession, method: str, host: str):
-        if url := await self.get_url_by_id(db, url_id):
-            await self.put_status(user_id, url_id, db, method=method, host=host)
-            return url.url
+        return await self._storage.get(db, UrlModel, url_id)
+
+    async def get_url_by_code(self, db, code):
+        if (short_id := decode_short_code(code)) is None:
+            return None
+        return await self._storage.get_by(db, UrlModel, 'short_id', short_id)
+
+    async def lookup(self, db, key: UUID | str) -> Tuple[UUID, str] | None:
+        if isinstance(key, UUID):
+            url = await self.get_url_by_id(db, key)
+        else:
+            url = await self.get_url_by_code(db, key)
+        return (url.id, url.url) if url else None
+
+    async def lookup_primary(self, key: UUID | str, session: Callable[[], AsyncContextManager]) -> Tuple[UUID, str] | None:
+        async with session() as db:
+            return await self.lookup(db, key)
+
+    async def lookup_consistent(self, key: UUID | str, session: Callable[[], AsyncContextManager],
+                                read_session: Callable[[], AsyncContextManager]) -> Tuple[UUID, str] | None:
+        # Lookups go to a replica, except for links this worker changed within DB_REPLICA_WRITE_WINDOW, which
+        # the replica may still hold as they were. A link missing on the replica is looked up again on the
+        # primary before being cached as missing, as it may be brand new.
+        if recent_writes.get(key) is not MISSING:
+            return await self.lookup_primary(key, session)
+        async with read_session() as db:
+            target = await self.lookup(db, key)
+        if target is None:
+            target = await self.lookup_primary(key, session)
+        return target
+
+    async def fetch(self, key: UUID | str, loader: Callable[[], Awaitable[Tuple[UUID, str] | None]],
+                    fresh_loader: Callable[[], Awaitable[Tuple[UUID, str] | None]] | None = None) -> Tuple[UUID, str] | None:
+        # Behind the local cache: the shared cache if there is one, then the loader. Concurrent misses
+        # of the same key in this worker wait for the first one.
+        target = await single_flight.do(('redirect', key), functools.partial(self._fetch, key, loader, fresh_loader))
+        redirect_cache.set(key, target)
+        return target
+
+    async def _fetch(self, key: UUID | str, loader: Callable[[], Awaitable[Tuple[UUID, str] | None]],
+                     fresh_loader: Callable[[], Awaitable[Tuple[UUID, str] | None]] | None) -> Tuple[UUID, str] | None:
+        if self._shared_cache is None:
+            return await loader()
+        if target := await self._shared_cache.get_or_load(redirect_key(key), loader, fresh_loader):
+            # Read back from JSON the id is a string.
+            return UUID(str(target[0])), target[1]
+        return None
+
+    async def load(self, db, key: UUID | str) -> Tuple[UUID, str] | None:
+        return await self.fetch(key, functools.partial(self.lookup, db, key))
+
+    async def warm_cache(self, db, limit: int) -> int:
+        # The most clicked urls are cached under both their id and short code.
+        urls = await self._storage.hot_urls(db, limit)
+        for url in urls:
+            target = (url.id, url.url)
+            redirect_cache.set(url.id, target)
+            if url.short_code:
+                redirect_cache.set(url.short_code, target)
+        return len(urls)
+
+    async def resolve(self, db, key: UUID | str) -> Tuple[UUID, str] | None:
+        # Redirects are keyed either by the url id or by its short code; both resolve to (id, target).
+        target = redirect_cache.get(key)
+        if target is MISSING:
+            target = await self.load(db, key)
+        return target
+
+    async def request(self, url_id: UUID | str, user_id: UUID | None, db: AsyncSession, method: str, host: str):
+        if target := await self.resolve(db, self.parse_key(url_id)):
+            url_id, url = target
+            event = ClickEvent(url_id=url_id, user_id=user_id, host=host, request_methods=method)
+            if not await click_ingestor.submit(event):
+                await self.put_status(user_id, url_id, db, request_methods=method, host=host)
+            return url
         raise HTTPException(status_code=404, detail='Не найдено.')
 
+    async def redirect(self, key: UUID | str, user_id: UUID | None, method: str, host: str,
+                       session: Callable[[], AsyncContextManager] | None = None,
+                       read_session: Callable[[], AsyncContextManager] | None = None) -> str | None:
+        # Same as request(), but a session is only opened when it is needed: on a miss of both caches
+        # for a key the url filter doesn't rule out, or to write the click when the ingestor is not running.
+        # Links another worker changed lately are read from the primary too: their shared cache entry is
+        # then still a tombstone.
+        session = session or self._storage.session
+        read_session = read_session or self._storage.read_session
+        target = redirect_cache.get(key)
+        if target is MISSING:
+            if self._url_filter is not None and not await self._url_filter.check(key, session):
+                return None
+            target = await self.fetch(key, functools.partial(self.lookup_consistent, key, session, read_session),
+                                      functools.partial(self.lookup_primary, key, session))
+        if target is None:
+            return None
+
+        url_id, url = target
+        event = ClickEvent(url_id=url_id, user_id=user_id, host=host, request_methods=method)
+        if not await click_ingestor.submit(event):
+            async with session() as db:
+                await self.put_status(user_id, url_id, db, request_methods=method, host=host)
+        return url
+
 
-request_service_db = RequestServiceDB()
+request_service_db = RequestServiceDB(storage, shared_cache, url_filter)
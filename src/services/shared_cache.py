@@ -0,0 +1,216 @@
+import asyncio
+import secrets
+import time
+
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import orjson
+
+from core.logger import logger
+from core.redis import RedisClient, RedisError
+from core.settings import settings
+
+
+# Deletes the lock only while it still holds the token of whoever took it.
+UNLOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+# Left in place of invalidated values for a while; not valid JSON, so it can't be mistaken for one.
+TOMBSTONE = b'!invalidated'
+
+
+class CacheBackend:
+    # A cache shared by every worker. Values are bytes, expiry is in seconds.
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        # Sets the value only when the key is absent, returns whether it did.
+        raise NotImplementedError
+
+    async def lock(self, key: str, ttl: float) -> str | None:
+        # Returns a token to unlock with, or None when someone else holds the lock.
+        raise NotImplementedError
+
+    async def unlock(self, key: str, token: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    # Stand-in for a single process and for tests.
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+
+    def _live(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def get(self, key: str) -> bytes | None:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._live(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def lock(self, key: str, ttl: float) -> str | None:
+        token = secrets.token_hex(8)
+        return token if await self.add(key, token.encode(), ttl) else None
+
+    async def unlock(self, key: str, token: str) -> None:
+        if self._live(key) == token.encode():
+            del self._data[key]
+
+
+class RedisCacheBackend(CacheBackend):
+
+    def __init__(self, client: RedisClient) -> None:
+        self.client = client
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.execute('GET', key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.execute('SET', key, value, 'PX', int(ttl * 1000))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self.client.execute('SET', key, value, 'NX', 'PX', int(ttl * 1000)) is not None
+
+    async def lock(self, key: str, ttl: float) -> str | None:
+        token = secrets.token_hex(8)
+        return token if await self.add(key, token.encode(), ttl) else None
+
+    async def unlock(self, key: str, token: str) -> None:
+        await self.client.execute('EVAL', UNLOCK_SCRIPT, 1, key, token)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class SharedCache:
+    # JSON values under a common prefix; None is cached too, as a negative entry with its own ttl.
+    # A miss is loaded by a single worker at a time: the others wait for its value for up to lock_wait
+    # seconds before loading it themselves. Backend failures are logged and treated as misses, the
+    # cache is never what takes the service down.
+    # Invalidated values are replaced by a tombstone for invalidate_ttl seconds and loads only store
+    # into absent keys, so a load that read the database before the change can't put the old value
+    # back. Until the tombstone expires the key is loaded on every read without being stored.
+
+    def __init__(self, backend: CacheBackend, *, prefix: str, ttl: float, negative_ttl: float, lock_ttl: float,
+                 lock_wait: float, invalidate_ttl: float = 5, poll_interval: float = 0.01) -> None:
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.invalidate_ttl = invalidate_ttl
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def _call(self, method: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        try:
+            return await method(*args)
+        except (OSError, asyncio.TimeoutError, RedisError):
+            self.errors += 1
+            logger.warning('Shared cache %s failed.', method.__name__, exc_info=True)
+            return None
+
+    async def _get(self, key: str) -> bytes | None:
+        raw = await self._call(self.backend.get, self.prefix + key)
+        if raw is not None and raw != TOMBSTONE:
+            self.hits += 1
+        return raw
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          fresh_loader: Callable[[], Awaitable[Any]] | None = None) -> Any:
+        # fresh_loader, when given, replaces loader while the key holds a tombstone: right after a change,
+        # when loader may read a replica that doesn't have it yet.
+        errors = self.errors
+        raw = await self._get(key)
+        if raw is not None and raw != TOMBSTONE:
+            return orjson.loads(raw)
+        self.misses += 1
+
+        # With the backend failing there is no lock to take or value to wait for, just load. A fresh
+        # tombstone won't be replaced by whoever holds the lock either.
+        if raw == TOMBSTONE:
+            return await (fresh_loader or loader)()
+        if self.errors != errors:
+            return await loader()
+        lock_key = f'{self.prefix}lock:{key}'
+        token = await self._call(self.backend.lock, lock_key, self.lock_ttl)
+        if token is None and self.errors == errors:
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                raw = await self._get(key)
+                if raw == TOMBSTONE:
+                    return await (fresh_loader or loader)()
+                if raw is not None:
+                    return orjson.loads(raw)
+
+        try:
+            value = await loader()
+            await self._call(self.backend.add, self.prefix + key, orjson.dumps(value),
+                             self.negative_ttl if value is None else self.ttl)
+        finally:
+            if token is not None:
+                await self._call(self.backend.unlock, lock_key, token)
+        return value
+
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            await self._call(self.backend.set, self.prefix + key, TOMBSTONE, self.invalidate_ttl)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+def redirect_key(key: Any) -> str:
+    return f'redirect:{key}'
+
+
+def url_key(id: Any) -> str:
+    return f'url:{id}'
+
+
+def create_shared_cache() -> SharedCache | None:
+    if not settings.SHARED_CACHE_BACKEND:
+        return None
+    if settings.SHARED_CACHE_BACKEND == 'memory':
+        backend = MemoryCacheBackend()
+    elif settings.SHARED_CACHE_BACKEND == 'redis':
+        backend = RedisCacheBackend(RedisClient(settings.SHARED_CACHE_URL, pool_size=settings.SHARED_CACHE_POOL_SIZE,
+                                                timeout=settings.SHARED_CACHE_TIMEOUT))
+    else:
+        raise ValueError(f'Unknown shared cache backend {settings.SHARED_CACHE_BACKEND!r}.')
+    return SharedCache(backend, prefix=settings.SHARED_CACHE_PREFIX, ttl=settings.SHARED_CACHE_TTL,
+                       negative_ttl=settings.SHARED_CACHE_NEGATIVE_TTL, lock_ttl=settings.SHARED_CACHE_LOCK_TTL,
+                       lock_wait=settings.SHARED_CACHE_LOCK_WAIT, invalidate_ttl=settings.SHARED_CACHE_INVALIDATE_TTL)
+
+
+shared_cache = create_shared_cache()
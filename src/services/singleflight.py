@@ -0,0 +1,60 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class Interrupted(Exception):
+    # Handed to the waiters of a call whose caller was cancelled, they then run it themselves.
+    pass
+
+
+class SingleFlight:
+    # Concurrent calls under the same key share the one already in flight: the first caller runs it and
+    # every caller that arrives before it finishes gets its result, or its exception. Nothing is kept once
+    # the call is done, this only collapses a burst of identical reads into one query. Shared results are
+    # the same objects for every caller, so they must be treated as read-only.
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while (flight := self._flights.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                # Shielded, so that a waiter going away doesn't cancel the call for the others.
+                return await asyncio.shield(flight)
+            except Interrupted:
+                continue
+
+        self.calls += 1
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.set_exception(Interrupted())
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+            # Marks the exception as retrieved when nobody was waiting for it.
+            flight.exception()
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._flights),
+        }
+
+
+single_flight = SingleFlight()
@@ -1,30 +1,50 @@
-from typing import List
+import csv
+import io
+
+from datetime import datetime
+from typing import AsyncIterator, List
 from uuid import UUID
 
-from sqlalchemy import select
+import orjson
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.settings import settings
+from db.database import storage
+from db.storage import EXPORT_COLUMNS, StorageBackend
 from models.models import StatusModel
+from services.counters import as_utc
 
 
 class StatusServiceDB:
 
-    async def get_request(self, url_id: UUID | None, user_id: UUID | None, host: str | None, request_methods: str | None, db: AsyncSession, *, skip=0, limit=100) -> List[StatusModel]:
+    def __init__(self, storage: StorageBackend) -> None:
+        self._storage = storage
+
+    async def get_request(self, url_id: UUID | None, user_id: UUID | None, host: str | None, request_methods: str | None, db: AsyncSession, *,
+                          since: datetime | None = None, until: datetime | None = None, skip=0, limit=100, cursor: str | None = None) -> List[StatusModel]:
 
-        statement = select(StatusModel).offset(skip).limit(limit)
+        return await self._storage.get_statuses(db, url_id=url_id, user_id=user_id, host=host, request_methods=request_methods,
+                                                since=as_utc(since), until=as_utc(until), skip=skip, limit=limit, cursor=cursor)
 
-        if host:
-            statement = statement.filter(StatusModel.host == host)
-        if request_methods:
-            statement = statement.filter(StatusModel.request_methods == request_methods)
-        if url_id:
-            statement = statement.filter(StatusModel.url_id == url_id)
-        if user_id:
-            statement = statement.filter(StatusModel.user_id == user_id)
+    async def export(self, db: AsyncSession, *, url_id: UUID | None, since: datetime | None, until: datetime | None,
+                     format: str = 'ndjson') -> AsyncIterator[bytes]:
+        # Rows come from the storage in batches, every batch is encoded into a single chunk of the response body.
+        batches = self._storage.export_statuses(db, url_id=url_id, since=as_utc(since), until=as_utc(until),
+                                                batch_size=settings.EXPORT_BATCH_SIZE)
 
-        obj = await db.execute(statement=statement)
+        if format == 'csv':
+            yield self.encode_csv(EXPORT_COLUMNS)
+        async for rows in batches:
+            if format == 'csv':
+                yield b''.join(self.encode_csv(row) for row in rows)
+            else:
+                yield b''.join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b'\n' for row in rows)
 
-        return obj.scalars().all()
+    def encode_csv(self, row) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return buffer.getvalue().encode()
 
 
-status_service_db = StatusServiceDB()
+status_service_db = StatusServiceDB(storage)
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import time
+
+from datetime import datetime, timedelta
+from typing import AsyncContextManager, Callable
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.bloom import BloomFilter
+from core.logger import logger
+from core.settings import settings
+from core.shortcodes import decode_short_code
+from db.database import storage
+from db.storage import StorageBackend
+from services.singleflight import single_flight
+
+
+def short_id_key(short_id: int) -> bytes:
+    return short_id.to_bytes(8, 'big')
+
+
+class UrlFilter:
+    # Bloom filter of the ids and short ids of live urls, so that redirects for made up keys are answered
+    # without a query. Until it is loaded every key might exist. Urls created by this worker are added
+    # right away, those created or revived by other workers on a refresh: a key the filter doesn't know
+    # triggers one when the last is older than refresh_interval. A refresh rescans the urls created or
+    # updated in the last refresh_overlap seconds before the newest change seen, which also covers
+    # transactions committing late. The timestamps are taken when the transaction starts though, so one
+    # committing later than that is missed by the refreshes: the filter is rebuilt from scratch every
+    # rebuild_interval seconds to pick those up.
+
+    def __init__(self, storage: StorageBackend, *, size: int, error_rate: float, refresh_interval: float,
+                 refresh_overlap: float, rebuild_interval: float, batch_size: int) -> None:
+        self._storage = storage
+        self.size = size
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.refresh_overlap = timedelta(seconds=refresh_overlap)
+        self.rebuild_interval = rebuild_interval
+        self.batch_size = batch_size
+        self.filter: BloomFilter | None = None
+        self.rejected = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+        self._newest: datetime | None = None
+        self._refreshed_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def add(self, id: UUID, short_id: int | None) -> None:
+        if self.filter is None:
+            return
+        self.filter.add(id.bytes)
+        if short_id:
+            self.filter.add(short_id_key(short_id))
+
+    async def _scan(self, db: AsyncSession, bloom: BloomFilter, since: datetime | None,
+                    newest: datetime | None) -> datetime | None:
+        # Returns the newest change seen, or newest when nothing newer was.
+        async for rows in self._storage.scan_urls(db, since=since, batch_size=self.batch_size):
+            for id, short_id, changed_at in rows:
+                bloom.add(id.bytes)
+                bloom.add(short_id_key(short_id))
+                if changed_at and (newest is None or changed_at > newest):
+                    newest = changed_at
+        return newest
+
+    async def load(self, db: AsyncSession) -> None:
+        # The current filter keeps answering until the new one is complete.
+        bloom = BloomFilter(self.size, self.error_rate)
+        refreshed_at = time.monotonic()
+        newest = await self._scan(db, bloom, None, None)
+        self.filter, self._newest, self._refreshed_at = bloom, newest, refreshed_at
+        if bloom.count > bloom.capacity:
+            logger.warning('Url filter holds %s keys for a capacity of %s, its false positive rate is %.4f.',
+                           bloom.count, bloom.capacity, bloom.error_rate)
+
+    async def refresh(self, db: AsyncSession) -> None:
+        if self.filter is None:
+            return
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+        newest = await self._scan(db, self.filter, self._newest - self.refresh_overlap if self._newest else None, self._newest)
+        if newest is not None and (self._newest is None or newest > self._newest):
+            self._newest = newest
+
+    def might_exist(self, key: UUID | str) -> bool:
+        if self.filter is None:
+            return True
+        if isinstance(key, UUID):
+            return key.bytes in self.filter
+        short_id = decode_short_code(key)
+        return short_id is not None and short_id_key(short_id) in self.filter
+
+    async def check(self, key: UUID | str, session: Callable[[], AsyncContextManager]) -> bool:
+        # False only for keys of no live url. Refreshes read the primary, replicas may not have new urls yet.
+        if self.might_exist(key):
+            return True
+        if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            await single_flight.do(('url_filter',), functools.partial(self._refresh, session))
+            if self.might_exist(key):
+                return True
+        self.rejected += 1
+        return False
+
+    async def _refresh(self, session: Callable[[], AsyncContextManager]) -> None:
+        async with session() as db:
+            await self.refresh(db)
+
+    async def start(self, session: Callable[[], AsyncContextManager]) -> None:
+        if self._task is None and self.rebuild_interval > 0:
+            self._task = asyncio.create_task(self._run(session))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, session: Callable[[], AsyncContextManager]) -> None:
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.rebuild(session)
+            except Exception:
+                logger.exception('Rebuilding the url filter failed.')
+
+    async def rebuild(self, session: Callable[[], AsyncContextManager]) -> None:
+        # Reads the primary like the refreshes. Also loads a filter whose first load failed.
+        async with session() as db:
+            await self.load(db)
+        self.rebuilds += 1
+
+    def stats(self) -> dict:
+        return {
+            'loaded': self.filter is not None,
+            'size': self.filter.size if self.filter else 0,
+            'keys': self.filter.count if self.filter else 0,
+            'capacity': self.filter.capacity if self.filter else 0,
+            'error_rate': self.filter.error_rate if self.filter else 0.0,
+            'rejected': self.rejected,
+            'refreshes': self.refreshes,
+            'rebuilds': self.rebuilds,
+        }
+
+
+def create_url_filter() -> UrlFilter | None:
+    if not settings.URL_FILTER_SIZE:
+        return None
+    return UrlFilter(storage, size=settings.URL_FILTER_SIZE, error_rate=settings.URL_FILTER_ERROR_RATE,
+                     refresh_interval=settings.URL_FILTER_REFRESH_INTERVAL,
+                     refresh_overlap=settings.URL_FILTER_REFRESH_OVERLAP, rebuild_interval=settings.URL_FILTER_REBUILD_INTERVAL,
+                     batch_size=settings.EXPORT_BATCH_SIZE)
+
+
+url_filter = create_url_filter()
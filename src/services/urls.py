@@ -1,11 +1,63 @@
+import functools
+
+from typing import Any, List
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from .base import ServiceDB
+from .cache import MISSING, recent_writes, redirect_cache
+from .shared_cache import redirect_key, shared_cache, url_key
+from .url_filter import UrlFilter, url_filter
 
+from core.shortcodes import encode_short_id
+from db.database import storage
 from models.models import UrlModel
-from schemas.urls import UrlCreateSchema, UrlUpdateSchema
+from schemas.urls import UrlCreateSchema, UrlReadSchema, UrlUpdateSchema
 
 
 class UrlServiceDB(ServiceDB[UrlModel, UrlCreateSchema, UrlUpdateSchema]):
-    pass
+    conflict_columns = ('url',)
+
+    def __init__(self, *args: Any, url_filter: UrlFilter | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._url_filter = url_filter
+
+    def _cache_keys(self, id: UUID, obj: Any) -> List[Any]:
+        keys = [id]
+        if short_id := getattr(obj, 'short_id', None):
+            keys.append(encode_short_id(short_id))
+        return keys
+
+    async def _invalidate(self, id: UUID, obj: Any) -> None:
+        # Also runs on creation, where the new url must stop being ruled out by the filter.
+        await super()._invalidate(id, obj)
+        for key in self._cache_keys(id, obj):
+            recent_writes.set(key, True)
+        if self._url_filter is not None and obj is not None and not obj.is_delete:
+            self._url_filter.add(id, getattr(obj, 'short_id', None))
+
+    def _shared_keys(self, id: UUID, obj: Any) -> List[str]:
+        return [redirect_key(key) for key in self._cache_keys(id, obj)] + [url_key(id)]
+
+    async def get_object(self, db: AsyncSession, id: UUID) -> UrlModel | UrlReadSchema | None:
+        # With a shared cache the url comes back as its read schema, which is all the API returns anyway.
+        # db may be a lagging replica: a url changed within DB_REPLICA_WRITE_WINDOW, by this worker or
+        # (going by the tombstone in the shared cache) another one, is read from the primary instead.
+        if self._shared_cache is None:
+            return await super().get_object(db, id)
+
+        async def load(session: AsyncSession) -> dict | None:
+            url = await super(UrlServiceDB, self).get_object(session, id)
+            return UrlReadSchema.from_orm(url).dict() if url else None
+
+        async def load_primary() -> dict | None:
+            async with self._storage.session() as primary:
+                return await load(primary)
+
+        loader = functools.partial(load, db) if recent_writes.get(id) is MISSING else load_primary
+        data = await self._shared_cache.get_or_load(url_key(id), loader, load_primary)
+        return UrlReadSchema.parse_obj(data) if data else None
 
 
-url_service_db = UrlServiceDB(UrlModel)
+url_service_db = UrlServiceDB(UrlModel, storage, caches=(redirect_cache,), shared_cache=shared_cache, url_filter=url_filter)
@@ -14,7 +14,7 @@ from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engin
 from sqlalchemy.orm import DeclarativeMeta
 
 from core.settings import Settings
-from db.database import create_sessionmaker, get_session
+from db.database import create_sessionmaker, get_read_session, get_session
 from main import app
 from models.models import Base, StatusModel, UrlModel
 from schemas import urls
@@ -27,6 +27,7 @@ settings = Settings()
 @pytest.fixture(scope='session')
 async def create_app(test_create_db):
     app.dependency_overrides[get_session] = get_session_for_dependency_overrides
+    app.dependency_overrides[get_read_session] = get_session_for_dependency_overrides
     yield app
 
 
@@ -1,11 +1,55 @@
+import asyncio
+import contextlib
+import copy
+import importlib.util
+import json
+import logging
 import os
+import time
+import uuid
+
+from datetime import datetime, timedelta, timezone
 
 from dotenv import load_dotenv
+from fastapi import HTTPException
+import httpx
 from httpx import URL, AsyncClient
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
 
-from services.requests import request_service_db
-from services.statuses import status_service_db
-from services.urls import url_service_db
+from benchmarks.run import Benchmark, compare, drive, parse_args, percentile
+from core.bloom import BloomFilter
+from core.hyperloglog import HyperLogLog
+from core.logger import JsonFormatter
+from core.metrics import Histogram
+from core.redis import RedisClient, RedisError
+from core.settings import settings
+from core.shortcodes import CODE_LENGTH, decode_short_code, encode_short_id
+from db.database import create_sessionmaker
+from db.explain import used_indexes
+from db.memory import MemoryStorage
+from db.pagination import InvalidCursor, decode_cursor, encode_cursor
+from db.partitions import StatusPartitionManager, next_start, partition_bounds, partition_name
+from db.postgres import PostgresStorage
+from db.replicas import ReplicaSet
+from middlewares.matchers import HostMatcher, NetworkMatcher
+from middlewares.middleware import RateLimitMiddleware
+from middlewares.ratelimit import MemoryRateLimitBackend
+from models.models import StatusModel, UrlModel
+from schemas import urls
+from server import implementation, worker_count
+from services.analytics import AnalyticsServiceDB
+from services.cache import MISSING, LRUCache, create_redirect_cache, recent_writes, redirect_cache
+from services.clicks import ClickEvent, ClickIngestor
+from services.counters import CounterServiceDB, counter_service_db, truncate
+from services.pagination import NEXT_CURSOR_HEADER
+from services.requests import RequestServiceDB, request_service_db
+from services.shared_cache import TOMBSTONE, MemoryCacheBackend, RedisCacheBackend, SharedCache, redirect_key
+from services.singleflight import SingleFlight
+from services.statuses import StatusServiceDB, status_service_db
+from services.url_filter import UrlFilter
+from services.urls import UrlServiceDB, url_service_db
 
 
 load_dotenv()
@@ -15,18 +59,25 @@ base_url = os.getenv('BASE_URL')
 class TestBaseAPI:
 
     async def test_root_handler(self, create_app):
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.get(create_app.url_path_for('root_handler'))
 
         assert response.status_code == 200
         assert response.json() == {'version': 'v1'}
 
     async def test_ping_db(self, create_app):
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.get(create_app.url_path_for('ping_db'))
 
         assert response.status_code == 200
 
+    async def test_pool_stats(self, create_app):
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('get_pool_stats'))
+
+        assert response.status_code == 200
+        assert {'checked_out', 'saturation', 'wait_time_max'} <= response.json().keys()
+
 
 class TestStatusAPI:
 
@@ -40,7 +91,7 @@ class TestStatusAPI:
 
 
     async def test_get_statuses(self, create_app, get_session_items, get_session):
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.get(create_app.url_path_for('get_status'))
             response_json = response.json()
 
@@ -51,11 +102,33 @@ class TestStatusAPI:
         assert response_json[0].get('request_methods') == get_session_items.request_methods
 
 
+class TestStatusExport:
+
+    async def test_export_ndjson(self, create_app, get_url_items, get_session):
+        url_obj, _ = get_url_items
+        expected = await status_service_db.get_request(url_id=url_obj.id, user_id=None, host=None, request_methods=None, db=get_session, limit=1000)
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('export_statuses'), params={'url_id': str(url_obj.id)})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert [row['id'] for row in rows] == [str(item.id) for item in expected]
+
+    async def test_export_csv(self, create_app, get_url_items):
+        url_obj, _ = get_url_items
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('export_statuses'), params={'url_id': str(url_obj.id), 'format': 'csv'})
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/csv')
+        assert response.text.splitlines()[0] == 'id,created_at,url_id,user_id,host,request_methods'
+
+
 class TestRequestAPI:
 
     async def test_get_request_with_client(self, create_app, get_session_items, get_url_items):
         url_obj, deleted_url = get_url_items
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.get(create_app.url_path_for('get_request', url_id=url_obj.id))
         assert response.status_code == 307
 
@@ -64,6 +137,98 @@ class TestRequestAPI:
         url = await request_service_db.request(url_id=url_obj.id, user_id=None, db=get_session, method='GET', host='http://testserver')
         assert url == url_obj.url
 
+    async def test_redirect_errors(self, create_app, get_url_items):
+        url_obj, deleted_url = get_url_items
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            missing = await client.get(create_app.url_path_for('get_request', url_id=deleted_url.id))
+            invalid = await client.get(create_app.url_path_for('get_request', url_id=url_obj.id), params={'user_id': 'user'})
+
+        assert missing.status_code == 404
+        assert missing.json() == {'detail': 'Не найдено.'}
+        assert invalid.status_code == 422
+
+
+class TestServer:
+
+    async def test_worker_count(self):
+        assert worker_count(4, 'postgres') == 4
+        assert worker_count(0, 'postgres') == (os.cpu_count() or 1)
+        assert worker_count(4, 'memory') == 1
+
+    async def test_implementation_fallback(self, monkeypatch):
+        monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+
+        assert implementation('loop', 'uvloop') == 'asyncio'
+        assert implementation('http', 'httptools') == 'h11'
+        assert implementation('loop', 'auto') == 'auto'
+
+    async def test_warm_cache(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        service = RequestServiceDB(storage)
+        await service.put_status(None, url_obj.id, None, request_methods='GET', host='')
+        redirect_cache.clear()
+
+        assert await service.warm_cache(None, 10) == 1
+        assert redirect_cache.get(url_obj.short_code) == (url_obj.id, url_obj.url)
+
+
+class TestBenchmark:
+
+    async def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+
+        assert [percentile(values, rank) for rank in (50, 95, 99, 100)] == [50.0, 95.0, 99.0, 100.0]
+        assert percentile([0.5], 99) == 0.5
+
+    async def test_compare(self):
+        baseline = {'redirect': {'throughput': 1000.0, 'p95': 0.010, 'p99': 0.020, 'errors': 0}}
+        within = {'redirect': {'throughput': 950.0, 'p95': 0.0105, 'p99': 0.021, 'errors': 0}, 'status': {}}
+        worse = {'redirect': {'throughput': 800.0, 'p95': 0.010, 'p99': 0.030, 'errors': 2}}
+
+        assert compare(within, baseline, tolerance=0.1) == []
+        assert [line.split()[1] for line in compare(worse, baseline, tolerance=0.1)] == ['throughput', 'p99', 'errors']
+
+    async def test_creates_never_repeat_urls(self):
+        posted = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            posted.append(json.loads(request.content)['url'])
+            return httpx.Response(201)
+
+        benchmark = Benchmark(parse_args([]))
+        async with AsyncClient(transport=httpx.MockTransport(handler), base_url=base_url) as client:
+            for total in (10, 50):
+                await drive(client, benchmark.requests()['create_single'], total, concurrency=4)
+
+        assert len(set(posted)) == len(posted) == 60
+
+
+class TestReplicaSet:
+
+    def replica_set(self, selection: str) -> ReplicaSet:
+        engines = [create_async_engine(f'postgresql+asyncpg://replica{index}/db') for index in range(3)]
+        return ReplicaSet([(engine, create_sessionmaker(engine)) for engine in engines], selection=selection)
+
+    async def test_round_robin(self):
+        replica_set = self.replica_set('round_robin')
+
+        assert [replica_set.choose() for _ in range(6)] == [0, 1, 2, 0, 1, 2]
+
+    async def test_least_loaded(self, monkeypatch):
+        replica_set = self.replica_set('least_loaded')
+        for engine, checked_out in zip(replica_set.engines, [3, 1, 1]):
+            monkeypatch.setattr(engine.sync_engine.pool, 'checkedout', lambda checked_out=checked_out: checked_out)
+
+        assert [replica_set.choose() for _ in range(4)] == [1, 1, 2, 1]
+
+    async def test_read_session_falls_back_to_primary(self):
+        sessions = []
+        storage = PostgresStorage(lambda: sessions.append('primary'))
+        storage.read_session()
+
+        assert sessions == ['primary']
+
 
 class TestUrlAPI:
 
@@ -72,6 +237,32 @@ class TestUrlAPI:
 
         assert response.url == create_url_schema.url
 
+    async def test_create_urls_returns_existing_duplicates(self, get_url_items, get_session):
+        url_obj, _ = get_url_items
+        new_url = f'www.google.com/{uuid.uuid4()}'
+        schemas = [urls.UrlCreateSchema(url=new_url), urls.UrlCreateSchema(url=url_obj.url), urls.UrlCreateSchema(url=new_url)]
+
+        response = await url_service_db.create_objects(db=get_session, obj=schemas)
+
+        assert [item.url for item in response] == [new_url, url_obj.url, new_url]
+        assert response[1].id == url_obj.id
+        assert response[0].id == response[2].id
+        assert response[0].short_code
+
+    async def test_import_urls(self, create_app, get_url_items):
+        url_obj, _ = get_url_items
+        new_url = f'www.google.com/{uuid.uuid4()}'
+        body = f'{{"url": "{new_url}"}}\nnot json\n\n{{"url": "{url_obj.url}"}}\n'
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.post(create_app.url_path_for('import_urls'), content=body)
+        results = [json.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == 200
+        assert [result['line'] for result in results] == [1, 2, 4]
+        assert results[0]['url'] == new_url
+        assert 'error' in results[1]
+        assert results[2]['id'] == str(url_obj.id)
+
     async def test_read_url(self, get_url_items, get_session):
         url_obj, _ = get_url_items
         response = await url_service_db.get_object(db=get_session, id=url_obj.id)
@@ -96,7 +287,7 @@ class TestUrlAPI:
 
     async def test_delete_url(self, create_app, get_url_items):
         url_obj, _ = get_url_items
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.delete(create_app.url_path_for('delete_url', id=url_obj.id))
         response_json = response.json()
 
@@ -107,14 +298,806 @@ class TestUrlAPI:
 class TestBannedHostsMiddleware:
 
     async def test_root_handler(self, create_app):
-        async with AsyncClient(create_app=create_app, base_url=base_url) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
             response = await client.get(create_app.url_path_for('root_handler'))
         assert response.status_code == 200
         assert response.json() == {'version': 'v1'}
 
     async def test_banned_hosts(self, create_app):
-        async with AsyncClient(create_app=create_app, base_url=URL('http://example.com')) as client:
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=URL('http://example.com')) as client:
             response = await client.get(create_app.url_path_for('root_handler'))
 
         assert response.status_code == 400
         assert response.text == 'Неверный текст ответа.'
+
+    async def test_host_matcher(self):
+        matcher = HostMatcher(['example.com', '*.example.org'])
+
+        assert matcher.match('example.com')
+        assert not matcher.match('www.example.com')
+        assert matcher.match('a.b.example.org')
+        assert not matcher.match('example.org')
+        assert not matcher.match('badexample.org')
+
+    async def test_network_matcher(self):
+        matcher = NetworkMatcher(['10.0.0.0/8', '192.168.1.5', '2001:db8::/32'])
+
+        assert matcher.match('10.20.30.40')
+        assert matcher.match('192.168.1.5')
+        assert not matcher.match('192.168.1.6')
+        assert matcher.match('2001:db8::1')
+        assert matcher.match('::ffff:10.0.0.1')
+        assert not matcher.match('testclient')
+
+
+class TestRedirectCache:
+
+    async def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2, ttl=60, negative_ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is MISSING
+        assert cache.get('c') == 3
+
+    async def test_ttl_and_negative_entries(self):
+        cache = LRUCache(maxsize=10, ttl=60, negative_ttl=0)
+        cache.set('missing', None)
+        cache.set('present', 'http://example.org')
+
+        assert cache.get('missing') is MISSING
+        assert cache.get('present') == 'http://example.org'
+
+    async def test_short_ttl_behind_shared_cache(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SHARED_CACHE_BACKEND', 'redis')
+        monkeypatch.setattr(settings, 'SHARED_CACHE_LOCAL_TTL', 5)
+        cache = create_redirect_cache()
+
+        assert cache.ttl == 5 and cache.negative_ttl == min(5, settings.REDIRECT_CACHE_NEGATIVE_TTL)
+
+    async def test_update_invalidates_redirect(self, get_url_items, get_session, create_url_schema):
+        url_obj, deleted_url = get_url_items
+        await request_service_db.resolve(get_session, deleted_url.id)
+        assert redirect_cache.get(deleted_url.id) is None
+
+        await request_service_db.resolve(get_session, url_obj.id)
+        await url_service_db.update_object(db=get_session, id=url_obj.id, obj=create_url_schema)
+
+        assert redirect_cache.get(url_obj.id) is MISSING
+
+
+class TestSharedCache:
+
+    def shared_cache(self, backend=None) -> SharedCache:
+        return SharedCache(backend or MemoryCacheBackend(), prefix='test:', ttl=60, negative_ttl=60, lock_ttl=5, lock_wait=1)
+
+    async def test_get_or_load(self):
+        cache, loads = self.shared_cache(), []
+
+        async def loader():
+            loads.append(1)
+            return None if len(loads) > 1 else ['a', 1]
+
+        assert await cache.get_or_load('present', loader) == ['a', 1]
+        assert await cache.get_or_load('present', loader) == ['a', 1]
+        assert await cache.get_or_load('missing', loader) is None
+        assert await cache.get_or_load('missing', loader) is None
+        assert len(loads) == 2
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    async def test_single_loader(self):
+        cache, loads = self.shared_cache(), []
+
+        async def loader():
+            loads.append(1)
+            await asyncio.sleep(0.05)
+            return 'value'
+
+        results = await asyncio.gather(*(cache.get_or_load('key', loader) for _ in range(5)))
+
+        assert results == ['value'] * 5
+        assert len(loads) == 1
+
+    async def test_backend_failure_is_a_miss(self):
+        class BrokenBackend(MemoryCacheBackend):
+            async def get(self, key):
+                raise ConnectionRefusedError()
+
+        cache = self.shared_cache(BrokenBackend())
+
+        async def loader():
+            return 'value'
+
+        assert await cache.get_or_load('key', loader) == 'value'
+        assert cache.errors == 1
+
+    async def test_dropped_connection_is_a_miss(self):
+        async def answer_once(reader, writer):
+            await reader.read(1024)
+            writer.write(b'$5\r\nval')
+            writer.close()
+
+        server = await asyncio.start_server(answer_once, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        cache = self.shared_cache(RedisCacheBackend(RedisClient(f'redis://127.0.0.1:{port}/0', timeout=1)))
+
+        async def loader():
+            return 'value'
+
+        async with server:
+            with pytest.raises(RedisError):
+                await cache.backend.client.execute('GET', 'key')
+            assert await cache.get_or_load('key', loader) == 'value'
+        assert cache.errors >= 1
+        await cache.backend.close()
+
+    async def test_update_invalidates_redirect(self, create_url_schema):
+        storage, cache = MemoryStorage(), self.shared_cache()
+        service = UrlServiceDB(UrlModel, storage, shared_cache=cache)
+        url_obj = await service.create_object(db=None, obj=create_url_schema)
+        requests = RequestServiceDB(storage, cache)
+
+        assert await requests.load(None, url_obj.short_code) == (url_obj.id, url_obj.url)
+        assert await cache.backend.get(f'test:{redirect_key(url_obj.short_code)}') is not None
+        assert (await service.get_object(db=None, id=url_obj.id)).url == url_obj.url
+
+        await service.update_object(db=None, id=url_obj.id, obj=urls.UrlUpdateSchema(url='https://example.org/'))
+
+        assert await cache.backend.get(f'test:{redirect_key(url_obj.short_code)}') == TOMBSTONE
+        assert (await service.get_object(db=None, id=url_obj.id)).url == 'https://example.org/'
+
+    async def test_load_started_before_invalidation_is_not_stored(self):
+        cache, values, release = self.shared_cache(), ['old', 'new'], asyncio.Event()
+
+        async def slow_loader():
+            value = values.pop(0)
+            await release.wait()
+            return value
+
+        async def loader():
+            return values.pop(0)
+
+        load = asyncio.create_task(cache.get_or_load('key', slow_loader))
+        await asyncio.sleep(0)
+        await cache.invalidate('key')
+        release.set()
+
+        assert await load == 'old'
+        assert await cache.get_or_load('key', loader) == 'new'
+        assert await cache.backend.get('test:key') == TOMBSTONE
+
+    async def test_reads_after_a_change_skip_the_replica(self, create_url_schema):
+        class LaggingStorage(MemoryStorage):
+            # The replica still serves the urls as they were created.
+            stale, replica_reads = {}, 0
+
+            def read_session(self):
+                return contextlib.nullcontext('replica')
+
+            async def get_by(self, db, model, column, value):
+                if db == 'replica':
+                    self.replica_reads += 1
+                    if value in self.stale:
+                        return self.stale[value]
+                return await super().get_by(db, model, column, value)
+
+        storage, cache = LaggingStorage(), self.shared_cache()
+        service = UrlServiceDB(UrlModel, storage, caches=(redirect_cache,), shared_cache=cache)
+        url_obj = await service.create_object(db=None, obj=create_url_schema)
+        other = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=urls.UrlCreateSchema(url='https://example.com/'))
+        storage.stale = {url_obj.id: copy.copy(url_obj), url_obj.short_id: copy.copy(url_obj)}
+        requests = RequestServiceDB(storage, cache)
+        recent_writes.clear()
+
+        assert await requests.redirect(other.short_code, user_id=None, method='GET', host='') == other.url
+        assert storage.replica_reads == 1
+
+        await service.update_object(db=None, id=url_obj.id, obj=urls.UrlUpdateSchema(url='https://example.org/'))
+
+        assert await requests.redirect(url_obj.short_code, user_id=None, method='GET', host='') == 'https://example.org/'
+        async with storage.read_session() as db:
+            assert (await service.get_object(db=db, id=url_obj.id)).url == 'https://example.org/'
+        # Changed by another worker: only the tombstone in the shared cache tells.
+        recent_writes.clear()
+        redirect_cache.invalidate(url_obj.id)
+        assert await requests.redirect(url_obj.id, user_id=None, method='GET', host='') == 'https://example.org/'
+        assert storage.replica_reads == 1
+
+
+class TestSingleFlight:
+
+    async def test_concurrent_calls_share_one(self):
+        flights, calls = SingleFlight(), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return object()
+
+        results = await asyncio.gather(*(flights.do('key', fn) for _ in range(5)), flights.do('other', fn))
+
+        assert len(calls) == 2
+        assert all(result is results[0] for result in results[:5])
+        assert flights.stats() == {'calls': 2, 'coalesced': 4, 'in_flight': 0}
+
+    async def test_reads_are_shared_per_database(self, create_url_schema):
+        class SlowStorage(MemoryStorage):
+            gets = 0
+
+            def target(self, db):
+                return db
+
+            async def get(self, db, model, id):
+                self.gets += 1
+                await asyncio.sleep(0.01)
+                return await super().get(db, model, id)
+
+        storage = SlowStorage()
+        service = UrlServiceDB(UrlModel, storage)
+        created = await service.create_object(db=None, obj=create_url_schema)
+
+        results = await asyncio.gather(*(service.get_object(db=db, id=created.id) for db in ('primary', 'primary', 'replica')))
+
+        assert storage.gets == 2
+        assert len({id(result) for result in results}) == 3
+        assert {result.url for result in results} == {created.url}
+
+    async def test_errors_are_shared(self):
+        flights = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            raise HTTPException(status_code=404)
+
+        results = await asyncio.gather(*(flights.do('key', fn) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, HTTPException) for result in results)
+
+    async def test_cancelled_caller_hands_over(self):
+        flights, calls = SingleFlight(), []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        first = asyncio.create_task(flights.do('key', fn))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.do('key', fn))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == 2
+
+
+class TestClickIngestor:
+
+    async def test_flushes_batches_on_stop(self, engine, get_url_items):
+        url_obj, _ = get_url_items
+        ingestor = ClickIngestor(PostgresStorage(create_sessionmaker(engine)), maxsize=100, batch_size=2, flush_interval=0.01, put_timeout=0)
+
+        assert await ingestor.submit(ClickEvent(url_id=url_obj.id, user_id=None, host='', request_methods='GET')) is False
+
+        await ingestor.start()
+        for _ in range(5):
+            await ingestor.submit(ClickEvent(url_id=url_obj.id, user_id=None, host='', request_methods='GET'))
+        await ingestor.stop()
+
+        assert ingestor.flushed == 5
+        assert ingestor.dropped == 0
+        assert ingestor.failed == 0
+
+    async def test_retries_failed_flushes(self):
+        class FlakyStorage(MemoryStorage):
+            failures = 2
+
+            async def add_statuses(self, db, rows):
+                if self.failures:
+                    self.failures -= 1
+                    raise OSError('connection lost')
+                await super().add_statuses(db, rows)
+
+        events = [ClickEvent(url_id=uuid.uuid4(), user_id=None, host='', request_methods='GET') for _ in range(3)]
+        ingestor = ClickIngestor(FlakyStorage(), maxsize=100, batch_size=10, flush_interval=0.01, put_timeout=0,
+                                 flush_retries=2, retry_backoff=0)
+        await ingestor._flush(events)
+        assert (ingestor.flushed, ingestor.failed, ingestor.batches) == (3, 0, 1)
+
+        ingestor = ClickIngestor(FlakyStorage(), maxsize=100, batch_size=10, flush_interval=0.01, put_timeout=0,
+                                 flush_retries=1, retry_backoff=0)
+        await ingestor._flush(events)
+        assert (ingestor.flushed, ingestor.failed, ingestor.batches) == (0, 3, 0)
+
+
+class TestClickCounters:
+
+    async def test_truncate(self):
+        moment = datetime(2026, 10, 18, 13, 45, 12, tzinfo=timezone.utc)
+
+        assert truncate(moment, 'hour') == datetime(2026, 10, 18, 13, tzinfo=timezone.utc)
+        assert truncate(moment, 'day') == datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+        # 01:15 at +05:30 is still the previous day in UTC.
+        offset = datetime(2026, 10, 19, 1, 15, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+        assert truncate(offset, 'hour') == datetime(2026, 10, 18, 19, tzinfo=timezone.utc)
+        assert truncate(offset, 'day') == datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+    async def test_put_status_increments_counters(self, get_url_items, get_session):
+        url_obj, _ = get_url_items
+        before = await counter_service_db.get_count(get_session, url_obj.id)
+
+        await request_service_db.put_status(None, url_obj.id, get_session, request_methods='GET', host='')
+
+        assert await counter_service_db.get_count(get_session, url_obj.id) == before + 1
+        buckets = await counter_service_db.get_buckets(get_session, url_obj.id, 'day')
+        assert sum(bucket.clicks for bucket in buckets) == before + 1
+
+    async def test_summary(self, create_app, get_url_items):
+        url_obj, _ = get_url_items
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('get_summary'), params={'url_id': str(url_obj.id), 'granularity': 'hour'})
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json['clicks'] == sum(bucket['clicks'] for bucket in response_json['buckets'])
+
+
+class TestAnalytics:
+
+    async def test_analytics(self, create_app, get_url_items, get_session):
+        url_obj, _ = get_url_items
+        await request_service_db.put_status(None, url_obj.id, get_session, request_methods='GET', host='analytics.example.org')
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('get_analytics'), params={'url_id': str(url_obj.id), 'granularity': 'minute'})
+        response_json = response.json()
+
+        assert response.status_code == 200
+        assert response_json['clicks'] == sum(bucket['clicks'] for bucket in response_json['buckets'])
+        assert 'analytics.example.org' in {item['host'] for item in response_json['top_hosts']}
+
+    async def test_aggregates_in_memory(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        users = [uuid.uuid4(), uuid.uuid4()]
+        for user_id, host in [(users[0], 'a.org'), (users[0], 'b.org'), (users[1], 'b.org'), (None, 'b.org')]:
+            await RequestServiceDB(storage).put_status(user_id, url_obj.id, None, request_methods='GET', host=host)
+
+        response = await AnalyticsServiceDB(storage).get_analytics(None, url_obj.id, granularity='minute', top=1)
+
+        assert response['clicks'] == 4
+        assert response['unique_users'] == 2
+        assert response['unique_hosts'] == 2
+        assert response['top_hosts'] == [{'host': 'b.org', 'clicks': 3}]
+
+    async def test_aggregates_share_the_range(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        await RequestServiceDB(storage).put_status(None, url_obj.id, None, request_methods='GET', host='a.org')
+        since = datetime.now(timezone.utc) + timedelta(seconds=1)
+
+        response = await AnalyticsServiceDB(storage).get_analytics(None, url_obj.id, granularity='hour', since=since,
+                                                                  until=since + timedelta(minutes=1))
+
+        assert response['since'] == since.replace(minute=0, second=0, microsecond=0)
+        assert response['until'] >= since + timedelta(minutes=1) and response['until'].minute == 0
+        assert response['clicks'] == sum(item['clicks'] for item in response['top_hosts'])
+        assert response['unique_hosts'] == len(response['top_hosts'])
+
+    async def test_rejects_bad_ranges(self):
+        service = AnalyticsServiceDB(MemoryStorage())
+        moment = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+        for since, until, granularity in [(moment, moment, 'hour'), (datetime(2000, 1, 1), moment, 'minute')]:
+            with pytest.raises(HTTPException) as error:
+                service.time_range(since, until, granularity)
+            assert error.value.status_code == 400
+
+
+class TestHyperLogLog:
+
+    async def test_estimate_within_error(self):
+        sketch = HyperLogLog()
+        sketch.update(uuid.uuid4() for _ in range(20000))
+
+        assert abs(sketch.count() - 20000) < 20000 * sketch.error * 4
+        assert HyperLogLog.from_bytes(sketch.to_bytes()).registers == sketch.registers
+
+    async def test_merge_is_union(self):
+        first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        first.update(range(0, 3000))
+        second.update(range(2000, 5000))
+        union.update(range(0, 5000))
+
+        assert first.merge(second).registers == union.registers
+        assert HyperLogLog().count() == 0
+
+    async def test_merge_takes_register_max(self):
+        sketches = [HyperLogLog(registers=os.urandom(4096).translate(bytes(range(64)) * 4)) for _ in range(3)]
+        expected = bytearray(map(max, *(sketch.registers for sketch in sketches)))
+
+        assert HyperLogLog.union(sketches).registers == expected
+        assert HyperLogLog(registers=sketches[0].registers).merge(sketches[1]).merge(sketches[2]).registers == expected
+
+    async def test_uniques_over_days(self):
+        storage = MemoryStorage()
+        url_id = uuid.uuid4()
+        day = datetime(2026, 3, 2, tzinfo=timezone.utc)
+        sketches = {}
+        for granularity, start, values in [('hour', day - timedelta(hours=2), range(0, 100)), ('day', day, range(100, 300)),
+                                        ('hour', day + timedelta(days=1), range(300, 350))]:
+            sketches[(url_id, 'users', granularity, start)] = HyperLogLog()
+            sketches[(url_id, 'users', granularity, start)].update(values)
+        await storage.add_sketches(None, sketches)
+
+        uniques = await CounterServiceDB(storage).get_uniques(None, url_id, 'users', 'hour', since=day - timedelta(hours=3),
+                                                              until=day + timedelta(days=1, hours=1))
+
+        assert abs(uniques.count() - 350) < 350 * uniques.error * 4
+
+    async def test_summary_uniques(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        user_id = uuid.uuid4()
+        for host in ['a.org', 'b.org', 'b.org']:
+            await RequestServiceDB(storage).put_status(user_id, url_obj.id, None, request_methods='GET', host=host)
+
+        counters = CounterServiceDB(storage)
+        assert (await counters.get_uniques(None, url_obj.id, 'users')).count() == 1
+        assert (await counters.get_uniques(None, url_obj.id, 'hosts', 'day', since=datetime.now(timezone.utc))).count() == 2
+
+        summary = await counters.get_summary(None, url_obj.id, 'hour', since=datetime.now(timezone.utc) + timedelta(hours=2))
+        assert (summary['clicks'], summary['unique_users'], summary['unique_hosts']) == (0, 0, 0)
+        summary = await counters.get_summary(None, url_obj.id)
+        assert (summary['clicks'], summary['unique_users'], summary['unique_hosts']) == (3, 1, 2)
+
+
+class TestUrlFilter:
+
+    def url_filter(self, storage) -> UrlFilter:
+        return UrlFilter(storage, size=1024, error_rate=0.01, refresh_interval=0, refresh_overlap=60, rebuild_interval=0,
+                         batch_size=2)
+
+    async def test_bloom_filter(self):
+        bloom = BloomFilter(size=4096, error_rate=0.01)
+        keys = [uuid.uuid4().bytes for _ in range(bloom.capacity)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+        assert sum(uuid.uuid4().bytes in bloom for _ in range(10000)) < 10000 * 0.03
+        assert bloom.error_rate == pytest.approx(0.01, rel=0.2)
+
+    async def test_rejects_unknown_keys(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        url_filter = self.url_filter(storage)
+        assert url_filter.might_exist(uuid.uuid4())
+
+        await url_filter.load(None)
+
+        assert url_filter.might_exist(url_obj.id) and url_filter.might_exist(url_obj.short_code)
+        assert not url_filter.might_exist('not-a-code')
+        requests = RequestServiceDB(storage, url_filter=url_filter)
+        assert await requests.redirect(uuid.uuid4(), None, 'GET', '', session=None) is None
+        assert url_filter.rejected == 1
+
+    async def test_sees_new_urls(self, create_url_schema):
+        storage = MemoryStorage()
+        url_filter = self.url_filter(storage)
+        await url_filter.load(None)
+        created = await UrlServiceDB(UrlModel, storage, url_filter=url_filter).create_object(db=None, obj=create_url_schema)
+        elsewhere = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=urls.UrlCreateSchema(url='https://example.org/'))
+
+        assert url_filter.might_exist(created.id)
+        assert not url_filter.might_exist(elsewhere.id)
+        assert await url_filter.check(elsewhere.id, storage.session)
+        assert url_filter.refreshes == 1
+
+    async def test_sees_revived_urls(self, create_url_schema):
+        storage = MemoryStorage()
+        service = UrlServiceDB(UrlModel, storage)
+        revived = await service.create_object(db=None, obj=create_url_schema)
+        revived.created_at -= timedelta(hours=1)
+        await service.delete_object(db=None, id=revived.id)
+        await service.create_object(db=None, obj=urls.UrlCreateSchema(url='https://example.org/'))
+        url_filter = self.url_filter(storage)
+        await url_filter.load(None)
+        assert not url_filter.might_exist(revived.id)
+
+        await service.create_object(db=None, obj=create_url_schema)
+
+        assert await url_filter.check(revived.id, storage.session)
+
+    async def test_rebuild_finds_late_commits(self, create_url_schema):
+        storage = MemoryStorage()
+        url_filter = self.url_filter(storage)
+        await url_filter.load(None)
+        # Committed late: created_at is far behind the newest url the refreshes have seen.
+        late = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        late.created_at -= timedelta(hours=1)
+        url_filter._newest = datetime.now(timezone.utc)
+
+        await url_filter.refresh(None)
+        assert not url_filter.might_exist(late.id)
+
+        await url_filter.rebuild(storage.session)
+        assert url_filter.might_exist(late.id)
+        assert url_filter.rebuilds == 1
+
+
+class TestKeysetPagination:
+
+    async def test_cursor_round_trip(self):
+        created_at, id = datetime(2026, 10, 18, tzinfo=timezone.utc), uuid.uuid4()
+
+        assert decode_cursor(encode_cursor(created_at, id)) == (created_at, id)
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not a cursor')
+
+    async def test_pages_cover_listing(self, get_url_items, get_session):
+        url_obj, _ = get_url_items
+        for _ in range(3):
+            await request_service_db.put_status(None, url_obj.id, get_session, request_methods='GET', host='')
+        expected = await status_service_db.get_request(url_id=url_obj.id, user_id=None, host=None, request_methods=None, db=get_session, limit=1000)
+
+        seen, cursor = [], None
+        while True:
+            page = await status_service_db.get_request(url_id=url_obj.id, user_id=None, host=None, request_methods=None, db=get_session, limit=2, cursor=cursor)
+            seen.extend(item.id for item in page)
+            if len(page) < 2:
+                break
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+        assert seen == [item.id for item in expected]
+
+    async def test_next_cursor_header(self, create_app, get_url_items):
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('read_urls'), params={'limit': 1})
+
+        assert response.status_code == 200
+        assert NEXT_CURSOR_HEADER in response.headers
+
+    async def test_invalid_cursor(self, create_app):
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('read_urls'), params={'cursor': 'not a cursor'})
+
+        assert response.status_code == 400
+        assert response.json() == {'detail': 'Invalid cursor.'}
+
+
+class TestQueryPlans:
+
+    async def test_redirect_lookup(self, engine, get_session):
+        statement = PostgresStorage(create_sessionmaker(engine)).lookup_statement(UrlModel, 'id', uuid.uuid4())
+
+        assert await used_indexes(get_session, statement) & {'urls_pkey', 'ix_urls_live_id'}
+
+    async def test_short_code_lookup(self, engine, get_session):
+        statement = PostgresStorage(create_sessionmaker(engine)).lookup_statement(UrlModel, 'short_id', 1)
+
+        assert 'ix_urls_short_id' in await used_indexes(get_session, statement)
+
+    async def test_url_listing(self, engine, get_session):
+        storage = PostgresStorage(create_sessionmaker(engine))
+        statement = storage.list_statement(UrlModel, cursor=encode_cursor(datetime.now(timezone.utc), uuid.uuid4()))
+
+        assert 'ix_urls_live_created_at' in await used_indexes(get_session, statement)
+
+    async def test_status_filters(self, engine, get_session):
+        storage = PostgresStorage(create_sessionmaker(engine))
+        cases = [
+            ({'url_id': uuid.uuid4()}, 'ix_statuses_url_id_created_at'),
+            ({'user_id': uuid.uuid4()}, 'ix_statuses_user_id_created_at'),
+            ({'host': 'example.org'}, 'ix_statuses_host_created_at'),
+            ({'request_methods': 'DELETE'}, 'ix_statuses_request_methods_created_at'),
+        ]
+        for filters, index in cases:
+            params = {'url_id': None, 'user_id': None, 'host': None, 'request_methods': None, **filters}
+            statement = storage.statuses_statement(**params).order_by(StatusModel.created_at, StatusModel.id).limit(100)
+
+            assert index in await used_indexes(get_session, statement), filters
+
+
+class TestStatusPartitions:
+
+    async def test_names_and_bounds(self):
+        start = datetime(2026, 12, 1, tzinfo=timezone.utc)
+
+        assert next_start(start, 'month') == datetime(2027, 1, 1, tzinfo=timezone.utc)
+        assert partition_bounds(partition_name(start, 'month')) == (start, datetime(2027, 1, 1, tzinfo=timezone.utc))
+        assert partition_bounds(partition_name(start, 'day')) == (start, datetime(2026, 12, 2, tzinfo=timezone.utc))
+        assert partition_bounds('statuses_default') is None
+
+    async def test_maintain_creates_ahead_and_retires(self, engine):
+        # The test engine autocommits, maintenance needs a transaction for its lock and savepoints.
+        manager = StatusPartitionManager(engine.execution_options(isolation_level='READ COMMITTED'), interval='month', ahead=1,
+                                         retention_days=1, retention_action='drop', check_interval=3600)
+
+        result = await manager.maintain(datetime(2100, 1, 15, tzinfo=timezone.utc))
+        assert result['created'] == ['statuses_p2100_01', 'statuses_p2100_02']
+
+        result = await manager.maintain(datetime(2100, 4, 1, tzinfo=timezone.utc))
+        assert result['created'] == ['statuses_p2100_04', 'statuses_p2100_05']
+        assert result['retired'] == ['statuses_p2100_01', 'statuses_p2100_02']
+
+    async def test_moves_rows_out_of_default(self, engine, get_url_items):
+        url_obj, _ = get_url_items
+        status_id = uuid.uuid4()
+        async with engine.connect() as conn:
+            await conn.execute(text("INSERT INTO statuses (id, created_at, host, url_id) VALUES (:id, '2200-01-10', '', :url_id)"),
+                               {'id': status_id, 'url_id': url_obj.id})
+        manager = StatusPartitionManager(engine.execution_options(isolation_level='READ COMMITTED'), interval='month', ahead=0,
+                                         retention_days=0, retention_action='drop', check_interval=3600)
+
+        result = await manager.maintain(datetime(2200, 1, 15, tzinfo=timezone.utc))
+
+        assert result['created'] == ['statuses_p2200_01']
+        async with engine.connect() as conn:
+            partition = await conn.execute(text('SELECT tableoid::regclass::text FROM statuses WHERE id = :id'), {'id': status_id})
+        assert partition.scalar() == 'statuses_p2200_01'
+
+
+class TestMemoryStorage:
+
+    async def test_url_crud(self, create_url_schema):
+        service = UrlServiceDB(UrlModel, MemoryStorage())
+        created = await service.create_object(db=None, obj=create_url_schema)
+
+        assert created.short_code is not None
+        assert (await service.get_object(db=None, id=created.id)).url == created.url
+
+        response = await service.create_objects(db=None, obj=[create_url_schema, urls.UrlCreateSchema(url='https://example.org/')])
+        assert response[0] is created
+        assert response[1].id != created.id
+
+        await service.delete_object(db=None, id=created.id)
+        assert await service.get_object(db=None, id=created.id) is None
+
+    async def test_create_revives_deleted(self, create_url_schema):
+        service = UrlServiceDB(UrlModel, MemoryStorage())
+        created = await service.create_object(db=None, obj=create_url_schema)
+        await service.delete_object(db=None, id=created.id)
+
+        revived = await service.create_object(db=None, obj=create_url_schema)
+        assert revived.id == created.id and not revived.is_delete
+        assert await service.get_object(db=None, id=created.id) is not None
+
+        await service.delete_object(db=None, id=created.id)
+        [revived] = await service.create_objects(db=None, obj=[create_url_schema])
+        assert revived.id == created.id and not revived.is_delete
+
+    async def test_listing_pages(self):
+        service = UrlServiceDB(UrlModel, MemoryStorage())
+        created = await service.create_objects(db=None, obj=[urls.UrlCreateSchema(url=f'https://example.org/{number}') for number in range(5)])
+
+        seen, cursor = [], None
+        while page := await service.get_objects(db=None, limit=2, cursor=cursor):
+            seen.extend(page)
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+        assert seen == sorted(created, key=lambda url: (url.created_at, url.id))
+
+    async def test_clicks(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        statuses, counters = StatusServiceDB(storage), CounterServiceDB(storage)
+        for method in ('GET', 'GET', 'POST'):
+            await RequestServiceDB(storage).put_status(None, url_obj.id, None, request_methods=method, host='example.org')
+
+        response = await statuses.get_request(url_id=url_obj.id, user_id=None, host=None, request_methods='GET', db=None)
+        assert len(response) == 2
+        assert await counters.get_count(None, url_obj.id) == 3
+        assert sum(bucket.clicks for bucket in await counters.get_buckets(None, url_obj.id, 'hour')) == 3
+
+        chunks = [chunk async for chunk in statuses.export(None, url_id=url_obj.id, since=None, until=None)]
+        assert len(b''.join(chunks).splitlines()) == 3
+
+    async def test_naive_ranges_are_utc(self, create_url_schema):
+        storage = MemoryStorage()
+        url_obj = await UrlServiceDB(UrlModel, storage).create_object(db=None, obj=create_url_schema)
+        statuses, counters = StatusServiceDB(storage), CounterServiceDB(storage)
+        await RequestServiceDB(storage).put_status(None, url_obj.id, None, request_methods='GET', host='example.org')
+        since, until = datetime(2000, 1, 1), datetime.utcnow() + timedelta(hours=1)
+
+        assert len(await statuses.get_request(url_id=url_obj.id, user_id=None, host=None, request_methods=None, db=None,
+                                              since=since, until=until)) == 1
+        chunks = [chunk async for chunk in statuses.export(None, url_id=url_obj.id, since=since, until=until)]
+        assert len(b''.join(chunks).splitlines()) == 1
+        summary = await counters.get_summary(None, url_obj.id, 'hour', since=since, until=until)
+        assert sum(bucket['clicks'] for bucket in summary['buckets']) == 1
+
+
+class TestShortCodes:
+
+    async def test_round_trip(self):
+        codes = {encode_short_id(short_id) for short_id in range(1, 1001)}
+
+        assert len(codes) == 1000
+        assert all(len(code) == CODE_LENGTH for code in codes)
+        assert sorted(decode_short_code(code) for code in codes) == list(range(1, 1001))
+
+    async def test_invalid_codes(self):
+        assert decode_short_code('abc') is None
+        assert decode_short_code('abc-def') is None
+
+    async def test_redirect_by_short_code(self, create_app, get_url_items):
+        url_obj, deleted_url = get_url_items
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            response = await client.get(create_app.url_path_for('get_request', url_id=url_obj.short_code))
+            deleted = await client.get(create_app.url_path_for('get_request', url_id=deleted_url.short_code))
+
+        assert response.status_code == 307
+        assert response.headers['location'] == url_obj.url
+        assert deleted.status_code == 404
+
+
+class TestRateLimit:
+
+    async def test_token_bucket(self):
+        backend = MemoryRateLimitBackend()
+        results = [await backend.hit('client', rate=1.0, burst=3) for _ in range(4)]
+
+        assert results[:3] == [0.0, 0.0, 0.0]
+        assert 0 < results[3] <= 1.0
+        assert await backend.hit('other', rate=1.0, burst=3) == 0.0
+
+    async def test_sweep_drops_idle_buckets(self):
+        backend = MemoryRateLimitBackend()
+        await backend.hit('client', rate=1000.0, burst=1)
+
+        assert backend.sweep(now=time.monotonic() + 60) == 1
+        assert len(backend) == 0
+
+    async def test_rule_paths(self):
+        middleware = RateLimitMiddleware(None, rules=[('POST', '/api/v1/urls/url', 1.0, 1), ('GET', '/api/v1/requests/', 1.0, 1)])
+
+        assert middleware.match_rule('POST', '/api/v1/urls/url') == 0
+        assert middleware.match_rule('POST', '/api/v1/urls/urls') is None
+        assert middleware.match_rule('POST', '/api/v1/urls/import') is None
+        assert middleware.match_rule('GET', '/api/v1/requests/abc') == 1
+
+    async def test_rejects_invalid_rules(self):
+        for rate, burst in ((0.0, 1), (-1.0, 1), (1.0, 0)):
+            with pytest.raises(ValueError):
+                RateLimitMiddleware(None, rules=[('POST', '/api/v1/urls/url', rate, burst)])
+
+
+class TestMetrics:
+
+    async def test_histogram_is_cumulative(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, '/a')
+
+        assert histogram.samples() == [
+            'latency_seconds_bucket{route="/a",le="0.1"} 1',
+            'latency_seconds_bucket{route="/a",le="1"} 2',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+            'latency_seconds_sum{route="/a"} 5.55',
+            'latency_seconds_count{route="/a"} 3',
+        ]
+
+    async def test_metrics_endpoint(self, create_app):
+        async with AsyncClient(transport=httpx.ASGITransport(app=create_app), base_url=base_url) as client:
+            await client.get(create_app.url_path_for('root_handler'))
+            response = await client.get(create_app.url_path_for('get_metrics'))
+
+        assert response.status_code == 200
+        assert 'http_requests_total{method="GET",route="/api/v1/",status="200"}' in response.text
+        assert 'cache_hit_ratio{cache="redirect"}' in response.text
+        assert 'db_pool_checkouts_total{engine="primary"}' in response.text
+        assert 'click_batches_total ' in response.text
+        assert 'click_events_total{outcome="batches"}' not in response.text
+
+
+class TestLogging:
+
+    async def test_json_formatter(self):
+        record = logging.LogRecord('root', logging.INFO, 'tests.py', 1, 'hello %s', ('world',), None)
+        payload = json.loads(JsonFormatter().format(record))
+
+        assert payload['level'] == 'INFO'
+        assert payload['message'] == 'hello world'